@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Throughput benchmarks for the Wumpus world
+
+Micro benchmarks time Environment.nextState alone, the getAction/nextState
+pair of every agent and the whole RLPlatform.updateLoop. Macro benchmarks
+run full experiments (experiment.run_experiments) over grid sizes, Wumpus
+dynamics and topologies. Every benchmark is seeded and reports its best
+steps/sec over the repetitions.
+
+Results are written as JSON; with --baseline, benchmarks slower than the
+baseline by more than --tolerance are reported and the exit code is 1.
+
+Usage: bench [-s <int>] [-m <int>] [-r <int>] [-o <path>] [-b <path>] [-t <float>] [-k <pattern>]
+
+Options:
+-h --help      Show the description of the program
+-s <int> --steps <int>   the number of steps of a micro benchmark [default: 20000]
+-m <int> --macro_steps <int>   the number of steps of each run of a macro benchmark [default: 5000]
+-r <int> --repeat <int>   the number of repetitions of each benchmark [default: 3]
+-o <path> --out <path>   the JSON file results are written to [default: bench_results.json]
+-b <path> --baseline <path>   a previous JSON result file to compare against [default: ]
+-t <float> --tolerance <float>   the allowed relative slowdown against the baseline [default: 0.2]
+-k <pattern> --only <pattern>   only run benchmarks whose name contains <pattern> [default: ]
+"""
+
+from __future__ import print_function
+
+import json
+import platform
+import sys
+import time
+import numpy as np
+from docopt import docopt
+
+import experiment
+import rng
+import wumpus_text
+from wumpus_text import Agent, Environment, RLPlatform
+
+SEED = 0
+
+
+def world_args(**options):
+    '''Options of wumpus_text (defaults, headless) overridden by options, e.g. grid_size=8'''
+    argv = ['--hmi=False', '--verbose=False', '--display=False']
+    argv += ['--{}={}'.format(key, value) for key, value in options.items()]
+    return docopt(wumpus_text.__doc__, argv=argv)
+
+
+class ReplayAgent(Agent):
+    '''Plays pre-drawn random actions, so that only the environment is timed'''
+    def __init__(self, n_steps):
+        Agent.__init__(self)
+        self.actions = [self.rng_.randint(1, wumpus_text.N_ACTIONS) for i in range(n_steps)]
+        self.t = 0
+
+    def getAction(self):
+        self.t += 1
+        return self.actions[self.t - 1]
+
+
+def agent_specs(grid_size=4, n_flash=5):
+    specs = [('random', 'Agent()'), ('engineered', 'tp4.EngineeredAgent()')]
+    encodings = [('BSF', 'tp4.BSF({})'.format(n_flash)),
+                 ('ABSF', 'tp4.ABSF({})'.format(n_flash)),
+                 ('XYBSF', 'tp4.XYBSF({}, {})'.format(grid_size, n_flash))]
+    for enc_name, enc in encodings:
+        specs += [('eps_greedy_' + enc_name, 'tp4.EpsilonGreedy(0.1, {})'.format(enc)),
+                  ('softmax_' + enc_name, 'tp4.Softmax(10, {})'.format(enc)),
+                  ('ucb_' + enc_name, 'tp4.UCB(1, {})'.format(enc))]
+    return specs
+
+
+def bench_environment(n_steps, my_args):
+    rng.seed(SEED)
+    agent = ReplayAgent(n_steps)
+    env = Environment(agent, my_args)
+    start = time.perf_counter()
+    for i in range(n_steps):
+        (s, a, reward, end_flag) = env.nextState()
+        agent.nextState(s, reward)
+        if end_flag:
+            env.reset()
+    return time.perf_counter() - start
+
+
+def bench_agent(n_steps, my_args, spec):
+    '''getAction + nextState on a recorded stream of states and rewards'''
+    rng.seed(SEED)
+    recorder = RLPlatform(experiment.make_agent('Agent()', {}), my_args)
+    stream = []
+    for i in range(n_steps):
+        (s, a, reward, end_flag) = recorder.environment.nextState()
+        recorder.agent.nextState(s, reward)
+        stream.append((s, reward))
+    agent = experiment.make_agent(spec, {})
+    agent.nextState(recorder.environment.getInitState(), 0.)
+    start = time.perf_counter()
+    for (s, reward) in stream:
+        agent.getAction()
+        agent.nextState(s, reward)
+    return time.perf_counter() - start
+
+
+def bench_platform(n_steps, my_args, spec):
+    rng.seed(SEED)
+    p = RLPlatform(experiment.make_agent(spec, {}), my_args)
+    start = time.perf_counter()
+    for i in range(n_steps):
+        p.updateLoop()
+    return time.perf_counter() - start
+
+
+def bench_experiment(n_steps, my_args, specs):
+    start = time.perf_counter()
+    experiment.run_experiments(specs, my_args)
+    return time.perf_counter() - start
+
+
+def benchmarks(my_args):
+    '''(name, function running the benchmark once and returning its seconds, steps per run)'''
+    n_steps = int(my_args['--steps'])
+    macro_steps = int(my_args['--macro_steps'])
+    for engine in ('python', 'indexed'):
+        for dyn in (False, True):
+            args = world_args(engine=engine, wumpus_dyn=dyn)
+            yield ('micro/env/{}/dyn={}'.format(engine, dyn),
+                   lambda args=args: bench_environment(n_steps, args), n_steps)
+    args = world_args()
+    for (name, spec) in agent_specs():
+        yield ('micro/agent/' + name, lambda spec=spec: bench_agent(n_steps, args, spec), n_steps)
+    for (name, spec) in agent_specs():
+        yield ('micro/platform/' + name, lambda spec=spec: bench_platform(n_steps, args, spec), n_steps)
+
+    macro_agents = ['Agent()', 'tp4.EngineeredAgent()', 'tp4.EpsilonGreedy(0.5, tp4.XYBSF({g}, 5))']
+    for grid_size in (4, 8):
+        for dyn in (False, True):
+            for tore in (True, False):
+                args = world_args(grid_size=grid_size, wumpus_dyn=dyn, tore=tore,
+                                  max_n_episode=macro_steps, runs=2, jobs=1)
+                specs = [spec.format(g=grid_size) for spec in macro_agents]
+                yield ('macro/grid={}/dyn={}/tore={}'.format(grid_size, dyn, tore),
+                       lambda args=args, specs=specs: bench_experiment(macro_steps, args, specs),
+                       macro_steps * 2 * len(specs))
+
+
+def compare(results, baseline, tolerance):
+    '''Names of the benchmarks slower than the baseline beyond tolerance'''
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['steps_per_sec'] / baseline[name]['steps_per_sec']
+        flag = ''
+        if ratio < 1. - tolerance:
+            regressions.append(name)
+            flag = '  <-- regression'
+        print('{:45s} {:8.2f}x{}'.format(name, ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    my_args = docopt(__doc__)
+    results = {}
+    for (name, run, n_steps) in benchmarks(my_args):
+        if my_args['--only'] not in name:
+            continue
+        seconds = min(run() for i in range(int(my_args['--repeat'])))
+        results[name] = {'seconds': seconds, 'steps': n_steps, 'steps_per_sec': n_steps / seconds}
+        print('{:45s} {:12.0f} steps/s'.format(name, n_steps / seconds))
+        sys.stdout.flush()
+
+    report = {
+        'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'numpy': np.__version__, 'machine': platform.platform(),
+                 'options': {k: v for k, v in my_args.items() if k != '--help'}},
+        'results': results}
+    with open(my_args['--out'], 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    if my_args['--baseline']:
+        with open(my_args['--baseline']) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, float(my_args['--tolerance']))
+        if regressions:
+            print('{} benchmark(s) slower than the baseline'.format(len(regressions)))
+            sys.exit(1)
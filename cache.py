@@ -0,0 +1,144 @@
+'''
+On-disk cache of run results, addressed by content.
+
+The key of a run is a hash of everything its result depends on: the
+agent spec and its namespace, the content of the files they name (e.g.
+checkpoint.load_agent('x.ckpt'): rewriting x.ckpt invalidates the
+entry), the options of wumpus_text that change the simulation (not
+--engine: both engines play the same steps, see check_engines), the seed
+of the run and the source code of the program (any edit of a .py file
+next to this one invalidates every entry). A run found
+in the cache is not played again: run seeds only depend on the spec (see
+experiment.run_seed), so re-running a comparison after adding an agent
+anywhere in the list only plays the new agent.
+
+Every entry is the compressed RewardStats state of one run (summary and
+reward curve, a few KB) in <directory>/<key>.npz. Hits refresh the
+modification time of their file; when the directory grows over its size
+bound, the least recently used entries are deleted.
+'''
+
+import glob
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+from stats import from_state
+
+# Options of wumpus_text that do not change the rewards of a run
+IGNORED_OPTIONS = ('--hmi', '--engine', '--verbose', '--display', '--runs', '--ci', '--max_runs', '--jobs',
+                   '--fps', '--render_every', '--plot', '--profile', '--profile_every',
+                   '--record', '--save', '--save_every', '--cache', '--cache_mb')
+
+_code_version = None
+
+
+def code_version():
+    '''Hash of the Python sources of the program'''
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+            digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+# String literals of an agent spec, some of which may be file names
+STRING_LITERAL = re.compile(r'''(?:'([^'\\]*)'|"([^"\\]*)")''')
+
+
+_file_hashes = {}  # (path, size, mtime) -> content hash, so that every run does not read the file again
+
+
+def file_hash(path):
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_size, info.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def referenced_files(agent_spec, namespace):
+    '''Content hash of every existing file named in the spec or by a string of its namespace'''
+    names = [single or double for (single, double) in STRING_LITERAL.findall(agent_spec)]
+    names += [value for value in namespace.values() if isinstance(value, str)]
+    return {name: file_hash(name) for name in sorted(set(names)) if name and os.path.isfile(name)}
+
+
+def run_key(agent_spec, namespace, my_args, seed_seq):
+    options = {name: value for (name, value) in my_args.items()
+               if name.startswith('--') and name not in IGNORED_OPTIONS}
+    content = {'agent': agent_spec, 'namespace': namespace, 'options': options,
+               'files': referenced_files(agent_spec, namespace),
+               'seed': [seed_seq.entropy, list(seed_seq.spawn_key)], 'code': code_version()}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    '''
+    RewardStats of runs, by run_key, in a directory of at most max_bytes
+    '''
+    def __init__(self, directory, max_bytes=100 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        '''RewardStats of the run, None if it is not cached'''
+        path = self.path(key)
+        try:
+            with np.load(path) as state:
+                stats = from_state(state)
+            os.utime(path)
+        except (IOError, OSError, ValueError, KeyError):  # missing, evicted meanwhile or truncated
+            return None
+        return stats
+
+    def put(self, key, stats):
+        path = self.path(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **stats.getState())
+        os.replace(tmp_path, path)  # concurrent runs never read a partial entry
+
+    def evict(self):
+        '''Delete the least recently used entries beyond max_bytes'''
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        total = sum(size for (mtime, size, path) in entries)
+        for (mtime, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def from_args(my_args):
+    '''
+    ResultCache of --cache, or None if there is none or runs have side
+    effects (--record, --save, --profile) that must happen again
+    '''
+    if not my_args.get("--cache") or my_args["--record"] or my_args["--save"] or my_args["--profile"]:
+        return None
+    return ResultCache(my_args["--cache"], int(my_args["--cache_mb"]) * 2**20)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Check that the indexed engine plays exactly like the python one
+
+For every grid size, topology and Wumpus dynamics, the same seeded
+random agent plays --steps steps with --engine=indexed and with
+--engine=python; the (state, action, reward, end) sequences must be
+identical. The exit code is 1 if they differ.
+
+Usage: check_engines [-s <int>] [-g <sizes>]
+
+Options:
+-h --help      Show the description of the program
+-s <int> --steps <int>   the number of steps of every check [default: 20000]
+-g <sizes> --grid_sizes <sizes>   comma-separated grid sizes [default: 2,4,7]
+"""
+
+from __future__ import print_function
+
+import sys
+from docopt import docopt
+
+import rng
+from bench import world_args
+from wumpus_text import Agent, Environment, N_ACTIONS
+
+
+class AnyActionAgent(Agent):
+    '''Random agent playing every action (Agent never flashes right)'''
+    def getAction(self):
+        return self.rng_.randint(1, N_ACTIONS+1)
+
+
+def trajectory(n_steps, **options):
+    rng.seed(0)
+    env = Environment(AnyActionAgent(), world_args(**options))
+    steps = []
+    for i in range(n_steps):
+        step = env.nextState()
+        env.agent.nextState(step[0], step[2])
+        if step[3]:
+            env.reset()
+        steps.append(step)
+    return steps
+
+
+if __name__ == "__main__":
+
+    my_args = docopt(__doc__)
+    n_steps = int(my_args['--steps'])
+    failed = False
+    for grid_size in [int(size) for size in my_args['--grid_sizes'].split(',')]:
+        for tore in ('True', 'False'):
+            for wumpus_dyn in ('False', 'True'):
+                options = dict(grid_size=grid_size, tore=tore, wumpus_dyn=wumpus_dyn)
+                same = trajectory(n_steps, engine='indexed', **options) == trajectory(n_steps, engine='python', **options)
+                failed |= not same
+                print('{:<55} {}'.format(str(options), 'ok' if same else 'DIFFERENT'))
+    sys.exit(1 if failed else 0)
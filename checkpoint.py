@@ -0,0 +1,149 @@
+'''
+Save and load learning agents (EpsilonGreedy, Softmax, UCB, Dyna of tp4).
+
+A checkpoint holds everything an agent needs to go on learning where it
+stopped: its Q-table, its state encoding, its exploration parameters,
+its current step and the state of its random stream. The replay buffer
+and model of a Dyna agent are not saved: they restart empty.
+
+experiment.run_job saves the agent of a run with --save, also every
+--save_every steps, and records in agent.steps_done the number of steps
+played. To resume an interrupted run, give checkpoint.load_agent(path)
+as its agent spec: the run goes on from steps_done up to --max_n_episode
+(in a new episode, the world is not saved).
+
+File layout: a HEADER_SIZE bytes header (magic, version, offset and
+size of the metadata), the arrays of the Q-table, each starting on an
+ALIGNMENT bytes boundary, then the metadata as JSON (parameters, and
+dtype/shape/offset of every array).
+
+Arrays are loaded with np.memmap, so loading does not read the tables:
+with mode='r' they are shared read-only between all the processes that
+load the same file (the agent is frozen: it acts but no longer learns),
+with mode='c' (copy on write) pages are only copied when the agent
+updates them, and the file is never modified.
+'''
+
+import json
+import os
+import numpy as np
+
+import qtable
+import rng
+import tp4
+
+MAGIC = b'WUMPCKPT'
+VERSION = 1
+HEADER_SIZE = 64
+ALIGNMENT = 64
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('meta_offset', '<u8'),
+                         ('meta_size', '<u8')])
+
+NOT_PARAMETERS = ('table', 'encoding', 'rng_')  # saved on their own
+NOT_SAVED = ('replay', 'model')  # experience of Dyna agents, restarted empty
+
+
+def plain(value):
+    '''Value as a JSON value (numpy scalars and tuples included)'''
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: plain(v) for (k, v) in value.items()}
+    if isinstance(value, (tuple, list)):
+        return [plain(v) for v in value]
+    return value
+
+
+def save_agent(agent, path):
+    (table_meta, arrays) = agent.table.getState()
+    params = {}
+    for (name, value) in vars(agent).items():
+        # callables are instance-level overrides (e.g. the profiler's wrappers), not state
+        if name not in NOT_PARAMETERS + NOT_SAVED and not callable(value):
+            params[name] = plain(value)
+    meta = {'agent': type(agent).__name__, 'params': params,
+            'encoding': {'class': type(agent.encoding).__name__,
+                         'state_dims': [int(dim) for dim in agent.encoding.state_dims]},
+            'table': plain(table_meta), 'rng': agent.rng_.getState(), 'arrays': {}}
+
+    # written next to path then renamed, so a failed save never leaves a corrupt checkpoint
+    tmp_path = '{}.tmp{}'.format(path, os.getpid())
+    try:
+        write_checkpoint(tmp_path, meta, arrays)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_checkpoint(path, meta, arrays):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * HEADER_SIZE)
+        for (name, array) in sorted(arrays.items()):
+            offset = -(-f.tell() // ALIGNMENT) * ALIGNMENT
+            f.write(b'\0' * (offset - f.tell()))
+            array = np.ascontiguousarray(array)
+            f.write(array.tobytes())
+            meta['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        meta_bytes = json.dumps(meta).encode('utf-8')
+        header = np.array((MAGIC, VERSION, f.tell(), len(meta_bytes)), dtype=HEADER_DTYPE)
+        f.write(meta_bytes)
+        f.seek(0)
+        f.write(header.tobytes())
+
+
+def read_metadata(path):
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError('{} is not an agent checkpoint'.format(path))
+    if header['version'] != VERSION:
+        raise ValueError('unsupported checkpoint version {} in {}'.format(header['version'], path))
+    with open(path, 'rb') as f:
+        f.seek(int(header['meta_offset']))
+        return json.loads(f.read(int(header['meta_size'])).decode('utf-8'))
+
+
+def load_agent(path, mode='c', restore_rng=True):
+    '''
+    Agent saved in path, with its arrays memory-mapped (mode 'r' or 'c',
+    see above). With restore_rng=False the agent keeps a fresh stream from
+    the current rng service instead of the saved one (e.g. to evaluate one
+    checkpoint with several seeds).
+    '''
+    if mode not in ('r', 'c'):
+        raise ValueError('unknown checkpoint mode: {}'.format(mode))
+    meta = read_metadata(path)
+    arrays = {}
+    for (name, layout) in meta['arrays'].items():
+        shape = tuple(layout['shape'])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=layout['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=layout['dtype'], mode=mode,
+                                     offset=layout['offset'], shape=shape)
+    table = qtable.from_state(meta['table'], arrays)
+    if meta['table']['backend'] == 'hashed':
+        # the hash index is small and changes when new states come in: keep it in memory
+        index = table.index
+        (index.keys, index.slot_rows) = (np.array(index.keys), np.array(index.slot_rows))
+        (index.row_keys, index.last_used) = (np.array(index.row_keys), np.array(index.last_used))
+    if mode == 'r':
+        table.freeze()
+
+    encoding_class = getattr(tp4, meta['encoding']['class'])
+    encoding = encoding_class.__new__(encoding_class)
+    tp4.StateEncoding.__init__(encoding, meta['encoding']['state_dims'])
+
+    agent_class = getattr(tp4, meta['agent'])
+    agent = agent_class.__new__(agent_class)  # no __init__: it would allocate a new table
+    agent.__dict__.update(meta['params'])
+    agent.rng_ = rng.stream()
+    if agent.pending is not None:
+        agent.pending = tuple(agent.pending)
+    agent.table = table
+    agent.encoding = encoding
+    if hasattr(agent, 'makeMemory'):
+        agent.makeMemory()
+    if restore_rng:
+        agent.rng_.setState(meta['rng'])
+    return agent
@@ -0,0 +1,189 @@
+'''
+Parallel experiment runner.
+
+Every (agent, run) pair of an experiment is an independent job: a fresh
+agent built from its spec string, a fresh platform, and its own random
+seed derived from the experiment seed. Jobs are handed out to a process
+pool and their reward statistics are gathered back in submission order, so
+results only depend on the seed, not on the number of workers.
+
+run_sequential adds runs only to the agents whose average reward is
+still uncertain and matters for the comparison. With --cache, runs
+already played with the same code and options are read back instead
+(see cache).
+'''
+
+import hashlib
+import json
+import os
+import numpy as np
+
+import cache
+import checkpoint
+import policy
+import rng
+import rollout
+import tp4
+from profiler import PhaseProfiler
+from stats import mean_interval
+from trajectory import TrajectoryWriter
+from wumpus_text import Agent, RLPlatform, WumpusTextHMI
+
+
+def make_agent(agent_spec, namespace):
+    '''Build an agent from a spec string such as "tp4.EpsilonGreedy(eps, tp4.BSF(n_flash))"'''
+    scope = {'np': np, 'tp4': tp4, 'checkpoint': checkpoint, 'policy': policy, 'rollout': rollout,
+             'Agent': Agent}
+    if 'solver.' in agent_spec:
+        import solver  # scipy is only needed by the solver
+        scope['solver'] = solver
+    scope.update(namespace)
+    return eval(agent_spec, scope)
+
+
+def run_job(job):
+    '''Run one (agent, run) job and return its RewardStats'''
+    (agent_spec, namespace, my_args, seed_seq, agent_index, run) = job
+    rng.seed(seed_seq)
+    agent = make_agent(agent_spec, namespace)
+    if my_args["--hmi"]=="True":
+        platform = WumpusTextHMI(agent, my_args)
+    else:
+        platform = RLPlatform(agent, my_args)
+    if my_args["--record"]:
+        platform.recorder = TrajectoryWriter('{}_{}_{}.traj'.format(my_args["--record"], agent_index, run))
+    if my_args["--profile"]:
+        PhaseProfiler(int(my_args["--profile_every"])).attach(platform)
+    save = my_args["--save"] and hasattr(agent, 'table')  # only learning agents can be checkpointed
+    save_path = '{}_{}_{}.ckpt'.format(my_args["--save"], agent_index, run)
+    save_every = int(my_args.get("--save_every") or 0) if save else 0
+    # an agent loaded from a checkpoint goes on from the step it was saved at
+    for i in range(getattr(agent, 'steps_done', 0), int(my_args["--max_n_episode"])):
+        platform.updateLoop()
+        if save_every and (i + 1) % save_every == 0:
+            agent.steps_done = i + 1
+            checkpoint.save_agent(agent, save_path)
+    if my_args["--hmi"]=="True":
+        platform.close()
+    if platform.recorder is not None:
+        platform.recorder.close()
+    if save:
+        agent.steps_done = max(getattr(agent, 'steps_done', 0), int(my_args["--max_n_episode"]))
+        checkpoint.save_agent(agent, save_path)
+    if platform.profiler is not None:
+        platform.profiler.dump('{}_{}_{}.json'.format(my_args["--profile"], agent_index, run))
+    return platform.stats
+
+
+def n_workers(my_args, n_jobs):
+    '''Pool size: --jobs if given (0 means one per CPU), never more than the number of jobs'''
+    if my_args["--hmi"]=="True":
+        return 1  # several displays would interleave in the terminal
+    n = int(my_args["--jobs"]) or os.cpu_count()
+    return max(1, min(n, n_jobs))
+
+
+def spec_key(agent_spec, namespace):
+    '''Integer identifying an agent spec and its namespace, whatever its position among other specs'''
+    content = json.dumps([agent_spec, sorted(namespace.items())], default=repr)
+    return int(hashlib.sha256(content.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def run_seed(my_args, agent_spec, namespace, run):
+    '''Seed of run `run` of an agent spec'''
+    return np.random.SeedSequence(int(my_args["--seed"]), spawn_key=(spec_key(agent_spec, namespace), run))
+
+
+def run_experiments(agent_specs, my_args, namespace=None, spec_ids=None, runs=None):
+    '''
+    Run --runs repetitions of every agent spec.
+
+    Return one list of RewardStats (one per run) per agent spec, in the
+    order of agent_specs. Run r of a spec always gets the same seed for a
+    given --seed, spec and namespace, whatever the other specs and the
+    number of workers (so a spec given twice plays the same runs twice).
+    spec_ids, if given, replace the positions k of the specs in file
+    names. runs, if given, are the run numbers played instead of
+    range(--runs).
+    '''
+    namespace = namespace or {}
+    if runs is None:
+        runs = range(int(my_args["--runs"]))
+    n_runs = len(runs)
+    if spec_ids is None:
+        spec_ids = range(len(agent_specs))
+    jobs = [(agent_spec, namespace, my_args, run_seed(my_args, agent_spec, namespace, run), k, run)
+            for k, agent_spec in zip(spec_ids, agent_specs)
+            for run in runs]
+
+    result_cache = cache.from_args(my_args)
+    if result_cache is not None:
+        keys = [cache.run_key(job[0], job[1], job[2], job[3]) for job in jobs]
+        results = [result_cache.get(key) for key in keys]
+    else:
+        results = [None] * len(jobs)
+    missing = [i for (i, stats) in enumerate(results) if stats is None]
+
+    n = n_workers(my_args, len(missing))
+    if n == 1:
+        new_results = [run_job(jobs[i]) for i in missing]
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(n)
+        try:
+            new_results = pool.map(run_job, [jobs[i] for i in missing], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    for (i, stats) in zip(missing, new_results):
+        results[i] = stats
+        if result_cache is not None:
+            result_cache.put(keys[i], stats)
+    if result_cache is not None and missing:
+        result_cache.evict()
+
+    return [results[k * n_runs:(k + 1) * n_runs]
+            for k in range(len(agent_specs))]
+
+
+def settled(intervals, k):
+    '''Whether the interval of agent k overlaps the one of no other agent (its rank is known)'''
+    (low, high) = intervals[k]
+    others = [interval for (j, interval) in enumerate(intervals) if j != k]
+    return bool(others) and all(high < other_low or other_high < low for (other_low, other_high) in others)
+
+
+def run_sequential(agent_specs, my_args, namespace=None, half_width=0.1, max_runs=100, level=0.95):
+    '''
+    Run every agent spec until its average reward/step is known well enough.
+
+    Runs come in batches of --runs (at least 2). After every batch, the
+    intervals of all the agents are computed again, and an agent gets one
+    more batch while the confidence interval of its average reward/step
+    is wider than +/- half_width and overlaps the interval of another
+    agent, unless it has max_runs runs. An agent that had stopped comes
+    back when another interval moves into its own. Agents with the same
+    number of runs share one run_experiments call. Return the RewardStats
+    of every agent, as run_experiments, with a varying number of runs.
+    '''
+    batch = int(my_args["--runs"])
+    if batch < 2:
+        raise ValueError('--runs must be at least 2 to estimate confidence intervals')
+    all_results = run_experiments(agent_specs, my_args, namespace)
+    while True:
+        intervals = []
+        for runs_stats in all_results:
+            (mean, width) = mean_interval([stats.mean() for stats in runs_stats], level)
+            intervals.append((mean - width, mean + width))
+        active = [k for k in range(len(agent_specs)) if len(all_results[k]) < max_runs
+                  and intervals[k][1] - intervals[k][0] > 2 * half_width and not settled(intervals, k)]
+        if not active:
+            return all_results
+        groups = {}  # agents by number of runs done
+        for k in active:
+            groups.setdefault(len(all_results[k]), []).append(k)
+        for (n_done, group) in sorted(groups.items()):
+            runs = range(n_done, min(n_done + batch, max_runs))
+            results = run_experiments([agent_specs[k] for k in group], my_args, namespace, spec_ids=group, runs=runs)
+            for (k, runs_stats) in zip(group, results):
+                all_results[k] = all_results[k] + runs_stats
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Hogwild-style parallel training of one Q-table
+
+Several worker processes, each with its own environment and random
+streams, play the same learning agent spec and update one dense QTable
+kept in multiprocessing.shared_memory. By default updates take no lock
+(Hogwild!): two workers updating the same entry at once may lose one of
+the two updates, and the cached greedy action of a row may be briefly
+stale, which barely matters when states are many. With --lock striped,
+rows are guarded by --n_stripes locks (row % n_stripes).
+
+Every worker plays --max_n_episode steps; the run reports the average
+reward of each worker and the total throughput, and can save the trained
+agent (see checkpoint).
+
+Usage: hogwild [-k <int>] [-l <name>] [-c <int>] [-a <spec>] [-o <path>] [--] [<wumpus_option>...]
+
+Options:
+-h --help      Show the description of the program
+-k <int> --workers <int>   the number of worker processes, 0 for one per CPU [default: 0]
+-l <name> --lock <name>   none or striped [default: none]
+-c <int> --n_stripes <int>   the number of locks with --lock striped [default: 64]
+-a <spec> --agent <spec>   the agent spec, with a dense Q-table [default: tp4.EpsilonGreedy(0.1, tp4.XYBSF(grid_size, n_flash))]
+-o <path> --save <path>   save the trained agent to this checkpoint [default: ]
+
+<wumpus_option> are options of wumpus_text, e.g. -- --grid_size=32 -e 1000000
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import time
+import numpy as np
+from docopt import docopt
+from multiprocessing import shared_memory
+
+import checkpoint
+import experiment
+import qtable
+import rng
+import wumpus_text
+from wumpus_text import RLPlatform
+
+ALIGNMENT = 64
+
+
+def share_table(table):
+    '''
+    Copy the arrays of a QTable into one new SharedMemory block.
+    Return (block, table metadata, layout) where layout gives
+    (dtype, shape, offset) of every array in the block.
+    '''
+    (meta, arrays) = table.getState()
+    (layout, size) = ({}, 0)
+    for (name, array) in sorted(arrays.items()):
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (array.dtype.str, array.shape, size)
+        size += array.nbytes
+    block = shared_memory.SharedMemory(create=True, size=max(1, size))
+    for (name, array) in arrays.items():
+        shared_arrays(block, {name: layout[name]})[name][...] = array
+    return (block, meta, layout)
+
+
+def shared_arrays(block, layout):
+    '''Arrays of the layout, as views on the block'''
+    return {name: np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+            for (name, (dtype, shape, offset)) in layout.items()}
+
+
+def lock_rows(table, locks):
+    '''Guard the updates of every row of a table by the lock of its stripe'''
+    update = table.update
+    n_stripes = len(locks)
+
+    def lockedUpdate(row, a, target):
+        with locks[row % n_stripes]:
+            update(row, a, target)
+    table.update = lockedUpdate
+
+
+def attach_agent(agent, block, meta, layout, locks=None):
+    '''Make an agent learn into the shared table'''
+    if agent.table.backend != 'dense' or meta['backend'] != 'dense':
+        raise ValueError('only dense Q-tables can be shared')
+    if agent.table.q.shape != tuple(layout['q'][1]):
+        raise ValueError('the agent does not have the shape of the shared table')
+    agent.table = qtable.from_state(meta, shared_arrays(block, layout))  # same rows: dense
+    if locks:
+        lock_rows(agent.table, locks)
+    return agent
+
+
+def train_worker(job):
+    '''Play one worker, put (worker id, average reward, error) in the results queue'''
+    (worker_id, agent_spec, namespace, my_args, seed_seq, block_name, meta, layout, locks, results) = job
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        rng.seed(seed_seq)
+        agent = attach_agent(experiment.make_agent(agent_spec, namespace), block, meta, layout, locks)
+        platform = RLPlatform(agent, my_args)
+        for i in range(int(my_args["--max_n_episode"])):
+            platform.updateLoop()
+        results.put((worker_id, platform.stats.mean(), None))
+        del agent, platform  # release the views on the block before closing it
+    except Exception as error:
+        results.put((worker_id, None, repr(error)))
+        raise
+    finally:
+        block.close()
+
+
+def train(agent_spec, my_args, n_workers, namespace=None, lock='none', n_stripes=64):
+    '''
+    Train one agent with n_workers processes sharing its Q-table.
+
+    Return (agent, average reward of every worker, elapsed seconds): the
+    agent is built from the spec in this process and holds a private copy
+    of the trained table.
+    '''
+    namespace = namespace or {}
+    rng.seed(int(my_args["--seed"]))
+    agent = experiment.make_agent(agent_spec, namespace)
+    (block, meta, layout) = share_table(agent.table)
+    context = multiprocessing.get_context()
+    locks = [context.Lock() for i in range(n_stripes)] if lock == 'striped' else None
+    results = context.Queue()
+    seeds = np.random.SeedSequence(int(my_args["--seed"])).spawn(n_workers)
+    workers = [context.Process(target=train_worker,
+                               args=((k, agent_spec, namespace, my_args, seed, block.name, meta,
+                                      layout, locks, results),))
+               for (k, seed) in enumerate(seeds)]
+    start = time.time()
+    try:
+        for worker in workers:
+            worker.start()
+        rewards = [None] * n_workers
+        for worker in workers:
+            (worker_id, rewards[worker_id], error) = results.get()
+            if error:
+                raise RuntimeError('worker {} failed: {}'.format(worker_id, error))
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - start
+        arrays = {name: array.copy() for (name, array) in shared_arrays(block, layout).items()}
+        agent.table = qtable.from_state(meta, arrays)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        block.close()
+        block.unlink()
+    return (agent, rewards, elapsed)
+
+
+def evaluate(agent, my_args, n_steps, seed=0):
+    '''Average reward of the agent, frozen, over n_steps'''
+    rng.seed(seed)
+    agent.table.freeze()
+    agent.rng_ = rng.stream()
+    platform = RLPlatform(agent, my_args)
+    for i in range(n_steps):
+        platform.updateLoop()
+    return platform.stats.mean()
+
+
+if __name__ == "__main__":
+
+    my_args = docopt(__doc__)
+    world_args = docopt(wumpus_text.__doc__, argv=my_args['<wumpus_option>'])
+    world_args.update({'--hmi': 'False', '--verbose': 'False', '--display': 'False'})
+    n_workers = int(my_args['--workers']) or os.cpu_count()
+    namespace = {'grid_size': int(world_args['--grid_size']), 'n_flash': int(world_args['--n_flash'])}
+    n_steps = int(world_args['--max_n_episode'])
+
+    (agent, rewards, elapsed) = train(my_args['--agent'], world_args, n_workers, namespace,
+                                      my_args['--lock'], int(my_args['--n_stripes']))
+    print('{} workers x {} steps in {:.1f}s: {:.0f} steps/s'.format(
+        n_workers, n_steps, elapsed, n_workers * n_steps / elapsed))
+    print('average reward of the workers: {}'.format(' '.join('{:.3f}'.format(r) for r in rewards)))
+    if my_args['--save']:
+        checkpoint.save_agent(agent, my_args['--save'])
+    print('average reward with the frozen table: {:.3f}'.format(evaluate(agent, world_args, min(n_steps, 100000))))
@@ -0,0 +1,55 @@
+'''
+Headless plotting of reward curves.
+
+Curves are reduced to at most n_buckets points before plotting: every
+bucket of consecutive points gives its mean, min and max, so long runs
+plot fast and keep their envelope. matplotlib is only imported by
+plot_curves, with the non-interactive Agg backend when the figure is
+written to a file.
+'''
+
+import numpy as np
+
+
+def downsample(steps, values, n_buckets=1000):
+    '''
+    (last step, mean, min, max) of each of (at most) n_buckets buckets of
+    consecutive points
+    '''
+    steps = np.asarray(steps)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= n_buckets:
+        return (steps, values, values, values)
+    bounds = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = bounds[:-1]
+    counts = np.diff(bounds)
+    means = np.add.reduceat(values, starts) / counts
+    return (steps[bounds[1:] - 1], means,
+            np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts))
+
+
+def plot_curves(curves, path=None, n_buckets=1000, xlabel='steps', ylabel='cumulative reward'):
+    '''
+    Plot (label, steps, values) curves, downsampled. Write the figure to
+    path if given, otherwise show it (blocking).
+    '''
+    import matplotlib
+    if path:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure()
+    for (label, steps, values) in curves:
+        (x, mean, low, high) = downsample(steps, values, n_buckets)
+        line, = plt.plot(x, mean, label=label)
+        if len(x) < len(values):
+            plt.fill_between(x, low, high, color=line.get_color(), alpha=0.3, linewidth=0)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.legend()
+    if path:
+        figure.savefig(path)
+        plt.close(figure)
+    else:
+        plt.show()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Frozen policies of learning agents, for fast evaluation
+
+compile_policy turns a learning agent of tp4 (EpsilonGreedy, Softmax,
+UCB, Dyna) into a Policy: per encoded state, either one action or the
+cumulative distribution of its actions, computed once from the Q-table.
+A FrozenAgent plays a Policy in an Environment without any learning,
+and evaluate_batch plays it in all the worlds of a VecEnvironment at once
+(one array lookup per step for every world).
+
+Policies are saved as compressed .npz files (save_policy, load_policy).
+
+Usage: policy <checkpoint> [-g <flag>] [-n <int>] [-e <int>] [-q <int>] [-o <path>] [--] [<wumpus_option>...]
+
+Options:
+-h --help      Show the description of the program
+-g <flag> --greedy <flag>   play the greedy action of every state instead of the agent's own distribution [default: False]
+-n <int> --n_envs <int>   the number of worlds played at once [default: 1024]
+-e <int> --n_steps <int>   the number of steps of every world [default: 1000]
+-q <int> --seed <int>   the seed of the evaluation [default: 0]
+-o <path> --out <path>   save the policy to this file [default: ]
+
+<checkpoint> is an agent saved with --save (see checkpoint),
+<wumpus_option> are options of wumpus_text, e.g. -- --grid_size=8
+"""
+
+from __future__ import print_function
+
+import bisect
+import numpy as np
+from docopt import docopt
+
+import tp4
+from wumpus_text import Agent, N_ACTIONS, packState
+from vec_env import VecEnvironment, X, Y, SMELL, BREEZE, N_FLASH
+
+# Actions drawn by Agent.getAction: 1..N_ACTIONS-1 (FLASH_RIGHT never is)
+RANDOM_ACTIONS = N_ACTIONS - 1
+
+
+class Policy(object):
+    '''
+    Action of every encoded state of an encoding: actions[row] (action
+    indices) if deterministic, else cdf[row] (cumulative probabilities
+    of the action indices). Rows are state ids, or, if state_ids is given
+    (agents with a hashed table), the positions in the sorted state_ids;
+    the last row is then played in states the agent never saw.
+    '''
+    def __init__(self, encoding, actions=None, cdf=None, state_ids=None):
+        self.encoding = encoding
+        self.actions = actions
+        self.cdf = cdf
+        self.state_ids = state_ids
+        if actions is not None:
+            self.action_list = (actions + 1).tolist()  # Action values, for FrozenAgent
+        if state_ids is not None:
+            self.row_of = dict(zip(state_ids.tolist(), range(len(state_ids))))
+
+    def deterministic(self):
+        return self.actions is not None
+
+    def row(self, state_id):
+        if self.state_ids is None:
+            return state_id
+        return self.row_of.get(state_id, len(self.state_ids))
+
+    def rows(self, state_ids):
+        if self.state_ids is None:
+            return state_ids
+        index = np.minimum(np.searchsorted(self.state_ids, state_ids), len(self.state_ids) - 1)
+        return np.where(self.state_ids[index] == state_ids, index, len(self.state_ids))
+
+    def actionsOf(self, rows, generator):
+        '''Action values played in the rows'''
+        if self.actions is not None:
+            return self.actions[rows] + 1
+        u = generator.random(len(rows))[:, None]
+        return np.minimum((self.cdf[rows] <= u).sum(axis=1), N_ACTIONS - 1) + 1
+
+    def nbytes(self):
+        arrays = [self.actions, self.cdf, self.state_ids]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+def distribution(agent, q, greedy, n_visits, n_state_visits, greedy_only=False):
+    '''
+    (actions, None) or (None, probabilities) of the action indices played
+    by the agent in rows of its Q-table
+    '''
+    n_rows = len(q)
+    if isinstance(agent, tp4.UCB):  # deterministic once the table is frozen
+        scores = q + agent.lbda * np.sqrt(2 * np.log(1 + n_state_visits)[:, None] / (1 + n_visits))
+        scores[n_visits == 0] = np.inf
+        return (scores.argmax(axis=1), None)
+    if greedy_only:
+        return (greedy.copy(), None)
+    if isinstance(agent, tp4.Softmax):
+        u = q / agent.temperature
+        p = np.exp(u - u.max(axis=1, keepdims=True))
+        return (None, p / p.sum(axis=1, keepdims=True))
+    if agent.epsilon == 0:
+        return (greedy.copy(), None)
+    p = np.zeros((n_rows, N_ACTIONS))
+    p[:, :RANDOM_ACTIONS] = agent.epsilon / RANDOM_ACTIONS
+    p[np.arange(n_rows), greedy] += 1 - agent.epsilon
+    return (None, p)
+
+
+def compile_policy(agent, greedy=False):
+    '''
+    Policy of a learning agent as it is now (its table is not modified);
+    greedy: play the greedy action of every state instead of exploring
+    '''
+    table = agent.table
+    n_rows = table.nRows()
+    arrays = [table.q[:n_rows], table.greedy[:n_rows], table.n_visits[:n_rows], table.n_state_visits[:n_rows]]
+    state_ids = None
+    if table.backend == 'hashed':
+        ids = table.index.stateIds(n_rows)
+        order = np.argsort(ids)
+        order = order[ids[order] >= 0]
+        state_ids = ids[order]
+        # plus the row of an unseen state, as the agent would find it
+        fresh = [np.zeros((1, N_ACTIONS)), np.zeros(1, dtype=np.int64),
+                 np.full((1, N_ACTIONS), table.prior_visits), np.full(1, N_ACTIONS * table.prior_visits)]
+        arrays = [np.concatenate((a[order], f)) for (a, f) in zip(arrays, fresh)]
+    (actions, p) = distribution(agent, *arrays, greedy_only=greedy)
+    if actions is not None:
+        return Policy(agent.encoding, actions.astype(np.int8), None, state_ids)
+    cdf = np.cumsum(p, axis=1).astype(np.float32)
+    cdf[:, -1] = 1.
+    return Policy(agent.encoding, None, cdf, state_ids)
+
+
+def save_policy(policy, path):
+    arrays = {'encoding_class': np.array(type(policy.encoding).__name__),
+              'state_dims': np.array(policy.encoding.state_dims)}
+    for name in ('actions', 'cdf', 'state_ids'):
+        if getattr(policy, name) is not None:
+            arrays[name] = getattr(policy, name)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def load_policy(path):
+    with np.load(path) as arrays:
+        encoding_class = getattr(tp4, str(arrays['encoding_class']))
+        encoding = encoding_class.__new__(encoding_class)
+        tp4.StateEncoding.__init__(encoding, [int(dim) for dim in arrays['state_dims']])
+        return Policy(encoding, *[arrays[name] if name in arrays else None
+                                  for name in ('actions', 'cdf', 'state_ids')])
+
+
+class FrozenAgent(Agent):
+    '''
+    Plays a Policy, and learns nothing
+    '''
+    def __init__(self, policy):
+        self.policy = policy
+        self.encoding = policy.encoding
+        Agent.__init__(self)
+
+    def reset(self):
+        self.current_action = Agent.getAction(self)  # random fake previous action, as EpsilonGreedy
+
+    def getAction(self):
+        row = self.policy.row(self.encoding.get_state_id(self))
+        if self.policy.actions is not None:
+            self.current_action = self.policy.action_list[row]
+        else:
+            cdf = self.policy.cdf[row].tolist()
+            self.current_action = 1 + min(bisect.bisect_right(cdf, self.rng_.uniform()), N_ACTIONS - 1)
+        return self.current_action
+
+    def nextState(self, s, reward):
+        Agent.nextState(self, s, reward)
+        self.last_action = self.current_action
+
+    def restoreState(self, s):
+        Agent.restoreState(self, s)
+        self.last_action = self.current_action
+
+
+class BatchState(object):
+    '''Packed states and last actions of many worlds, read by the encodings as an agent'''
+    def __init__(self, states, last_action):
+        self.state_ = packState(states[:, X], states[:, Y], states[:, SMELL], states[:, BREEZE], states[:, N_FLASH])
+        self.last_action = last_action
+
+
+def evaluate_batch(policy, my_args, n_envs, n_steps, seed=None):
+    '''
+    Play the policy for n_steps in n_envs worlds of a VecEnvironment.
+    Return the average reward/step of every world.
+    '''
+    env = VecEnvironment(n_envs, my_args, seed)
+    random = np.random.default_rng(seed)
+    last_action = random.integers(1, N_ACTIONS, size=n_envs)
+    total = np.zeros(n_envs)
+    for i in range(n_steps):
+        rows = policy.rows(policy.encoding.get_state_id(BatchState(env.getStates(), last_action)))
+        actions = policy.actionsOf(rows, random)
+        (states, rewards, end_flags) = env.step(actions)
+        total += rewards
+        last_action = actions
+        if end_flags.any():
+            last_action[end_flags] = random.integers(1, N_ACTIONS, size=int(end_flags.sum()))
+    return total / n_steps
+
+
+if __name__ == "__main__":
+
+    import time
+    import checkpoint
+    import wumpus_text
+
+    my_args = docopt(__doc__)
+    world_args = docopt(wumpus_text.__doc__, argv=my_args['<wumpus_option>'])
+    agent = checkpoint.load_agent(my_args['<checkpoint>'], mode='r')
+    policy = compile_policy(agent, my_args['--greedy'] == 'True')
+    print('{} policy, {} KB'.format('deterministic' if policy.deterministic() else 'stochastic',
+                                    policy.nbytes() // 1024))
+    if my_args['--out']:
+        save_policy(policy, my_args['--out'])
+    (n_envs, n_steps) = (int(my_args['--n_envs']), int(my_args['--n_steps']))
+    start = time.time()
+    means = evaluate_batch(policy, world_args, n_envs, n_steps, int(my_args['--seed']))
+    elapsed = time.time() - start
+    print('average reward/step over {} worlds x {} steps: {:.3f} +/- {:.3f} ({:.0f} steps/s)'.format(
+        n_envs, n_steps, means.mean(), means.std() / np.sqrt(n_envs), n_envs * n_steps / elapsed))
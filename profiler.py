@@ -0,0 +1,108 @@
+'''
+Per-phase profiling of a platform (RLPlatform or WumpusTextHMI).
+
+A step of updateLoop goes through four phases: the agent picks an
+action (act), the environment applies it (env), the agent takes in the
+new state and reward (learn) and the platform keeps its statistics and
+logs (log). PhaseProfiler.attach() replaces, on the instances only,
+agent.getAction, agent.nextState, environment.nextState and
+platform.updateLoop by timed wrappers, so a platform that is not
+profiled runs the plain methods and pays nothing.
+
+Times are accumulated with time.perf_counter. Every `every` steps a
+sample of the cumulative timers and counters is appended to samples;
+snapshot() can be called at any time, dump() writes everything as JSON.
+'''
+
+import json
+import time
+
+from wumpus_text import Outcome
+
+PHASES = ('act', 'env', 'learn', 'log')
+
+
+class PhaseProfiler(object):
+    '''
+    Cumulative per-phase timers and step/episode/outcome counters
+    '''
+    def __init__(self, every=1000):
+        self.every = every
+        self.seconds = dict.fromkeys(PHASES, 0.)
+        self.n_steps = 0
+        self.n_episodes = 0
+        self.samples = []
+        self.platform = None
+
+    def attach(self, platform):
+        '''Instrument a platform, its agent and its environment'''
+        self.platform = platform
+        agent = platform.agent
+        environment = platform.environment
+        seconds = self.seconds
+        clock = time.perf_counter
+        (get_action, agent_next_state) = (agent.getAction, agent.nextState)
+        (env_next_state, update_loop) = (environment.nextState, platform.updateLoop)
+
+        def getAction():
+            start = clock()
+            a = get_action()
+            seconds['act'] += clock() - start
+            return a
+
+        def nextState(s, reward):
+            start = clock()
+            agent_next_state(s, reward)
+            seconds['learn'] += clock() - start
+
+        def environmentNextState():
+            start = clock()
+            act = seconds['act']
+            result = env_next_state()
+            # the environment asks the agent for its action: not env time
+            seconds['env'] += clock() - start - (seconds['act'] - act)
+            if result[3]:
+                self.n_episodes += 1
+            return result
+
+        def updateLoop():
+            start = clock()
+            inner = seconds['act'] + seconds['env'] + seconds['learn']
+            update_loop()
+            seconds['log'] += clock() - start - (seconds['act'] + seconds['env'] + seconds['learn'] - inner)
+            self.n_steps += 1
+            if self.n_steps % self.every == 0:
+                self.samples.append(self.snapshot())
+
+        agent.getAction = getAction
+        agent.nextState = nextState
+        environment.nextState = environmentNextState
+        platform.updateLoop = updateLoop
+        platform.profiler = self
+        return self
+
+    def counters(self):
+        counts = self.platform.environment.events_.counts
+        return {'steps': self.n_steps, 'episodes': self.n_episodes,
+                'wumpus_deaths': counts[Outcome.WUMPUS], 'hole_deaths': counts[Outcome.HOLE],
+                'treasures': counts[Outcome.TREASURE], 'kills': counts[Outcome.KILL]}
+
+    def snapshot(self):
+        '''Current cumulative timers (seconds) and counters'''
+        snapshot = self.counters()
+        snapshot.update(('time_' + phase, self.seconds[phase]) for phase in PHASES)
+        return snapshot
+
+    def report(self):
+        '''One line per phase: total time, share and time per step'''
+        total = sum(self.seconds.values()) or 1.
+        lines = []
+        for phase in PHASES:
+            lines.append('{:6s} {:9.3f}s {:6.1%} {:8.3f}us/step'.format(
+                phase, self.seconds[phase], self.seconds[phase] / total,
+                1e6 * self.seconds[phase] / max(1, self.n_steps)))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({'every': self.every, 'final': self.snapshot(), 'samples': self.samples}, f, indent=1)
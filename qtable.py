@@ -0,0 +1,283 @@
+'''
+Tabular action-value store shared by the agents of tp4.
+
+Q[s, a] is kept as the mean of the update targets seen for (s, a):
+cum_rewards[s, a] / n_visits[s, a], refreshed only for the updated
+entry. The greedy action of every state is tracked as updates arrive,
+so picking it costs one lookup instead of an argmax over the row.
+
+States are stored in rows. Two backends map encoded state ids to rows:
+'dense' uses the state id itself (one row per possible state), 'hashed'
+keeps an open-addressing hash table in arrays and allocates rows only
+for visited states, growing as needed and optionally evicting the
+least recently used states beyond max_rows.
+'''
+
+import numpy as np
+
+EMPTY = -1
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing
+MAX_LOAD = 0.5  # hash slots used before doubling
+EVICTED_FRACTION = 8  # evict 1/8 of the rows at once when full
+
+
+class DenseIndex(object):
+    '''
+    The row of a state is its id
+    '''
+    def __init__(self, n_states):
+        self.n_states = n_states
+
+    def row(self, state_id):
+        return state_id
+
+    def stateIds(self, n_rows):
+        '''State id of every row (-1 for unused rows)'''
+        return np.arange(n_rows)
+
+
+class HashedIndex(object):
+    '''
+    Open-addressing (linear probing) map from state ids to rows of a QTable.
+
+    keys/slot_rows are the hash slots, row_keys/last_used describe rows.
+    With max_rows set, the least recently used rows are evicted (and
+    reset) when all rows are taken.
+    '''
+    def __init__(self, table, n_rows, max_rows=None):
+        self.table = table
+        self.max_rows = max_rows
+        if max_rows is not None:
+            n_rows = min(n_rows, max_rows)
+        self.n_rows = 0  # rows handed out
+        self.row_keys = np.full(n_rows, EMPTY, dtype=np.int64)
+        self.last_used = np.zeros(n_rows, dtype=np.int64)
+        self.tick = 0
+        self.free_rows = []
+        self.rehash(2 * n_rows)
+
+    def rehash(self, n_slots):
+        '''Rebuild the hash slots (a power of two) from row_keys'''
+        n_slots = 1 << max(3, int(n_slots - 1).bit_length())
+        self.mask = n_slots - 1
+        self.shift = 64 - n_slots.bit_length() + 1
+        self.keys = np.full(n_slots, EMPTY, dtype=np.int64)
+        self.slot_rows = np.full(n_slots, EMPTY, dtype=np.int64)
+        self.n_keys = 0
+        for row in np.flatnonzero(self.row_keys != EMPTY):
+            self.insert(int(self.row_keys[row]), row)
+
+    def insert(self, state_id, row):
+        '''Put a state that is not in the slots yet'''
+        i = ((state_id * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        while self.keys[i] != EMPTY:
+            i = (i + 1) & self.mask
+        self.keys[i] = state_id
+        self.slot_rows[i] = row
+        self.n_keys += 1
+
+    def row(self, state_id):
+        state_id = int(state_id)
+        i = ((state_id * HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self.shift
+        keys = self.keys
+        key = keys[i]
+        while key != state_id:
+            if key == EMPTY:
+                return self.add(state_id)
+            i = (i + 1) & self.mask
+            key = keys[i]
+        row = self.slot_rows[i]
+        if self.max_rows is not None:
+            self.tick += 1
+            self.last_used[row] = self.tick
+        return row
+
+    def add(self, state_id):
+        '''Give a row to a new state'''
+        row = self.newRow()  # may evict rows and rehash
+        if self.n_keys + 1 > MAX_LOAD * len(self.keys):
+            self.rehash(2 * len(self.keys))
+        self.row_keys[row] = state_id
+        self.insert(state_id, row)
+        if self.max_rows is not None:
+            self.tick += 1
+            self.last_used[row] = self.tick
+        return row
+
+    def newRow(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.n_rows == len(self.row_keys):
+            if self.max_rows is not None and self.n_rows >= self.max_rows:
+                self.evict()
+                return self.free_rows.pop()
+            self.grow(2 * self.n_rows if self.max_rows is None
+                      else min(2 * self.n_rows, self.max_rows))
+        self.n_rows += 1
+        return self.n_rows - 1
+
+    def grow(self, n_rows):
+        self.row_keys = np.concatenate((self.row_keys, np.full(n_rows - len(self.row_keys), EMPTY)))
+        self.last_used = np.concatenate((self.last_used, np.zeros(n_rows - len(self.last_used), dtype=np.int64)))
+        self.table.resizeRows(n_rows)
+
+    def evict(self):
+        '''Free the least recently used rows'''
+        n_evicted = max(1, self.n_rows // EVICTED_FRACTION)
+        rows = np.argpartition(self.last_used[:self.n_rows], n_evicted - 1)[:n_evicted]
+        self.row_keys[rows] = EMPTY
+        self.table.clearRows(rows)
+        self.free_rows = rows.tolist()
+        self.rehash(len(self.keys))
+
+    def stateIds(self, n_rows):
+        '''State id of every row (-1 for unused rows)'''
+        return self.row_keys[:n_rows]
+
+
+class QTable(object):
+    '''
+    Incremental-mean Q-values with cached greedy actions.
+
+    prior_visits is the initial visit count of every entry, all with a
+    zero target: 1 as in EpsilonGreedy and Softmax, 0 for UCB (unvisited
+    entries then read Q=0 with n_visits=0).
+
+    All methods but row() take the row of a state, given by row(state_id).
+    '''
+    def __init__(self, n_states, n_actions, prior_visits=1., backend='dense', n_rows=1024, max_rows=None):
+        self.n_actions = n_actions
+        self.prior_visits = float(prior_visits)
+        self.backend = backend
+        if backend == 'dense':
+            self.index = DenseIndex(n_states)
+            n_rows = n_states
+        elif backend == 'hashed':
+            self.index = HashedIndex(self, n_rows, max_rows)
+            n_rows = len(self.index.row_keys)
+        else:
+            raise ValueError('unknown Q-table backend: {}'.format(backend))
+        self.cum_rewards = np.zeros((n_rows, n_actions))
+        self.n_visits = np.full((n_rows, n_actions), self.prior_visits)
+        self.q = np.zeros((n_rows, n_actions))
+        self.n_state_visits = self.n_visits.sum(axis=1)
+        self.greedy = np.zeros(n_rows, dtype=np.int64)  # argmax of q[s], first one on ties
+        self.row = self.index.row
+
+    def resizeRows(self, n_rows):
+        n_new = n_rows - len(self.q)
+        self.cum_rewards = np.concatenate((self.cum_rewards, np.zeros((n_new, self.n_actions))))
+        self.n_visits = np.concatenate((self.n_visits, np.full((n_new, self.n_actions), self.prior_visits)))
+        self.q = np.concatenate((self.q, np.zeros((n_new, self.n_actions))))
+        self.n_state_visits = np.concatenate((self.n_state_visits, np.full(n_new, self.n_actions * self.prior_visits)))
+        self.greedy = np.concatenate((self.greedy, np.zeros(n_new, dtype=np.int64)))
+
+    def clearRows(self, rows):
+        self.cum_rewards[rows] = 0.
+        self.n_visits[rows] = self.prior_visits
+        self.q[rows] = 0.
+        self.n_state_visits[rows] = self.n_actions * self.prior_visits
+        self.greedy[rows] = 0
+
+    def nRows(self):
+        '''Number of rows in use'''
+        if self.backend == 'dense':
+            return len(self.q)
+        return self.index.n_rows
+
+    def nbytes(self):
+        arrays = [self.cum_rewards, self.n_visits, self.q, self.n_state_visits, self.greedy]
+        if self.backend == 'hashed':
+            arrays += [self.index.keys, self.index.slot_rows, self.index.row_keys, self.index.last_used]
+        return sum(a.nbytes for a in arrays)
+
+    def freeze(self):
+        '''
+        Stop learning: updates are ignored, and a hashed table no longer
+        evicts (rows are only ever added). Used for read-only shared tables.
+        '''
+        self.update = self.ignoreUpdate
+        self.updateBatch = self.ignoreUpdate
+        if self.backend == 'hashed':
+            self.index.max_rows = None
+
+    def ignoreUpdate(self, row, a, target):
+        pass
+
+    def getState(self):
+        '''(metadata, arrays) describing the whole table, see from_state'''
+        meta = {'n_actions': self.n_actions, 'prior_visits': self.prior_visits, 'backend': self.backend}
+        arrays = {'cum_rewards': self.cum_rewards, 'n_visits': self.n_visits, 'q': self.q,
+                  'n_state_visits': self.n_state_visits, 'greedy': self.greedy}
+        if self.backend == 'dense':
+            meta['n_states'] = self.index.n_states
+        else:
+            index = self.index
+            meta.update(max_rows=index.max_rows, n_rows=index.n_rows, tick=index.tick,
+                        free_rows=[int(row) for row in index.free_rows], n_keys=index.n_keys)
+            arrays.update(keys=index.keys, slot_rows=index.slot_rows,
+                          row_keys=index.row_keys, last_used=index.last_used)
+        return (meta, arrays)
+
+    def values(self, row):
+        return self.q[row]
+
+    def greedyAction(self, row):
+        return self.greedy[row]
+
+    def maxValue(self, row):
+        return self.q[row, self.greedy[row]]
+
+    def update(self, row, a, target):
+        '''Add one target to the mean of (row, a)'''
+        self.cum_rewards[row, a] += target
+        self.n_visits[row, a] += 1.
+        self.n_state_visits[row] += 1.
+        q_s = self.q[row]
+        old = q_s[a]
+        q_s[a] = self.cum_rewards[row, a] / self.n_visits[row, a]
+        g = self.greedy[row]
+        if a == g:
+            if q_s[a] < old:
+                self.greedy[row] = q_s.argmax()
+        elif q_s[a] > q_s[g] or (q_s[a] == q_s[g] and a < g):
+            self.greedy[row] = a
+
+    def updateBatch(self, rows, actions, targets):
+        '''
+        update() for arrays of entries at once (an entry may appear several
+        times); the greedy action of every updated row is recomputed
+        '''
+        np.add.at(self.cum_rewards, (rows, actions), targets)
+        np.add.at(self.n_visits, (rows, actions), 1.)
+        np.add.at(self.n_state_visits, rows, 1.)
+        self.q[rows, actions] = self.cum_rewards[rows, actions] / self.n_visits[rows, actions]
+        self.greedy[rows] = self.q[rows].argmax(axis=1)
+
+
+def from_state(meta, arrays):
+    '''Rebuild a QTable from QTable.getState(), using the given arrays as they are'''
+    table = QTable.__new__(QTable)
+    table.n_actions = meta['n_actions']
+    table.prior_visits = meta['prior_visits']
+    table.backend = meta['backend']
+    for name in ('cum_rewards', 'n_visits', 'q', 'n_state_visits', 'greedy'):
+        setattr(table, name, arrays[name])
+    if table.backend == 'dense':
+        table.index = DenseIndex(meta['n_states'])
+    else:
+        index = table.index = HashedIndex.__new__(HashedIndex)
+        index.table = table
+        index.max_rows = meta['max_rows']
+        index.n_rows = meta['n_rows']
+        index.tick = meta['tick']
+        index.free_rows = list(meta['free_rows'])
+        index.n_keys = meta['n_keys']
+        index.keys = arrays['keys']
+        index.slot_rows = arrays['slot_rows']
+        index.row_keys = arrays['row_keys']
+        index.last_used = arrays['last_used']
+        index.mask = len(index.keys) - 1
+        index.shift = 64 - len(index.keys).bit_length() + 1
+    table.row = table.index.row
+    return table
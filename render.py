@@ -0,0 +1,140 @@
+'''
+Text rendering of the Wumpus world for WumpusTextHMI.
+
+TextRenderer turns a snapshot of the world into a frame (a list of
+text lines: the grid, then status lines) in one pass, and writes it
+with a single write per frame. On a terminal, only the characters that
+changed since the last frame are redrawn, with ANSI cursor moves;
+otherwise (output piped to a file) whole frames are appended.
+
+RenderThread draws the latest published snapshot at a fixed rate from
+a separate thread, so the simulation does not wait for the terminal.
+'''
+
+import sys
+import threading
+
+CLEAR = '\x1b[2J\x1b[H'
+
+
+def goto(row, col):
+    '''ANSI cursor move (0-based row and column)'''
+    return '\x1b[{};{}H'.format(row + 1, col + 1)
+
+
+class TextRenderer(object):
+    '''
+    Frames of one world: the holes and the treasure do not move, so the
+    background is built once and only the Wumpuses and the hunter are placed
+    on a copy of it.
+
+    A snapshot is (agent position, Wumpus positions, status lines).
+    '''
+    def __init__(self, grid_size, hole_positions, treasure_pos, images, draw_contours=True, out=None):
+        self.grid_size = grid_size
+        self.images = images  # dict: 'wumpus', 'hole', 'treasure', 'hunter' -> one character
+        self.draw_contours = draw_contours
+        self.out = out or sys.stdout
+        self.ansi = hasattr(self.out, 'isatty') and self.out.isatty()
+        self.previous = None
+
+        (n_lines, n_cols) = (grid_size[0], grid_size[1])
+        if draw_contours:
+            border = '-' * (2 * n_cols + 1)
+            self.background = [list(border if i % 2 == 0 else '|' + ' |' * n_cols)
+                               for i in range(2 * n_lines + 1)]
+        else:
+            self.background = [[' '] * n_cols for i in range(n_lines)]
+        self.fixed = set()
+        fixed = [(pos, images['hole']) for pos in hole_positions] + [(treasure_pos, images['treasure'])]
+        for (pos, image) in fixed:
+            (row, col) = self.charCoord(pos)
+            self.background[row][col] = image
+            self.fixed.add((row, col))
+        self.background = [''.join(chars) for chars in self.background]
+
+    def charCoord(self, pos):
+        '''(row, column) of the character of a grid position, None if off the grid'''
+        if not (0 <= pos[0] < self.grid_size[0] and 0 <= pos[1] < self.grid_size[1]):
+            return None
+        (line, col) = (self.grid_size[1] - pos[1] - 1, pos[0])
+        if self.draw_contours:
+            return (2 * line + 1, 2 * col + 1)
+        return (line, col)
+
+    def frame(self, snapshot):
+        '''Lines of text of a snapshot'''
+        (agent_pos, wumpus_positions, status) = snapshot
+        lines = list(self.background)
+        for wumpus_pos in wumpus_positions:
+            wumpus = self.charCoord(wumpus_pos)
+            if wumpus is not None and wumpus not in self.fixed:  # holes and treasure are drawn over it
+                self.place(lines, wumpus, self.images['wumpus'])
+        hunter = self.charCoord(agent_pos)
+        if hunter is not None:
+            self.place(lines, hunter, self.images['hunter'])
+        return lines + [''] + list(status)
+
+    def place(self, lines, coord, image):
+        (row, col) = coord
+        lines[row] = lines[row][:col] + image + lines[row][col + 1:]
+
+    def draw(self, snapshot):
+        lines = self.frame(snapshot)
+        if not self.ansi:
+            text = '\n'.join(lines) + '\n\n'
+        elif self.previous is None:
+            text = CLEAR + '\n'.join(lines) + '\n'
+        else:
+            parts = []
+            for (row, line) in enumerate(lines):
+                old = self.previous[row] if row < len(self.previous) else ''
+                if line == old:
+                    continue
+                line = line.ljust(len(old))
+                old = old.ljust(len(line))
+                cursor = -1  # column the cursor is at after the last character written
+                for (col, (char, old_char)) in enumerate(zip(line, old)):
+                    if char != old_char:
+                        parts.append(char if col == cursor else goto(row, col) + char)
+                        cursor = col + 1
+            for row in range(len(lines), len(self.previous)):  # erase lines the frame lost
+                parts.append(goto(row, 0) + '\x1b[K')
+            parts.append(goto(len(lines), 0))
+            text = ''.join(parts)
+        self.previous = lines
+        self.out.write(text)
+        self.out.flush()
+
+
+class RenderThread(threading.Thread):
+    '''
+    Draws the last published snapshot, at most fps times per second
+    '''
+    def __init__(self, renderer, fps):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.renderer = renderer
+        self.period = 1. / fps
+        self.latest = None  # replaced (not modified) by publish: no lock needed
+        self.drawn = None
+        self.stopped = threading.Event()
+
+    def publish(self, snapshot):
+        self.latest = snapshot
+
+    def drawLatest(self):
+        snapshot = self.latest
+        if snapshot is not None and snapshot is not self.drawn:
+            self.renderer.draw(snapshot)
+            self.drawn = snapshot
+
+    def run(self):
+        while not self.stopped.wait(self.period):
+            self.drawLatest()
+
+    def stop(self):
+        '''Stop the thread and draw the last snapshot'''
+        self.stopped.set()
+        self.join()
+        self.drawLatest()
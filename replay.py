@@ -0,0 +1,106 @@
+'''
+Experience replay and a learned tabular model, for Dyna-style planning.
+
+A ReplayBuffer keeps the last transitions (state id, action, reward,
+next state id, done) in one preallocated structured numpy array used as
+a ring. A TabularModel learns the mean reward of every (state, action)
+from the real steps. Planning draws a batch of transitions from the
+buffer, with the reward of the model (less noisy than the one sample)
+and the next state of the transition (so next states keep the frequency
+they were met with), and applies all the updates at once with
+QTable.updateBatch.
+'''
+
+import numpy as np
+
+from qtable import EVICTED_FRACTION, QTable
+
+TRANSITION_DTYPE = np.dtype([('state', np.int64), ('action', np.int64), ('reward', np.float64),
+                             ('next_state', np.int64), ('done', bool)])
+
+
+class ReplayBuffer(object):
+    '''
+    The last capacity transitions, oldest overwritten first
+    '''
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=TRANSITION_DTYPE)
+        self.capacity = capacity
+        self.next = 0  # index of the next transition written
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done=False):
+        self.data[self.next] = (state, action, reward, next_state, done)
+        self.next = (self.next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def markDone(self):
+        '''The last transition added ended its episode'''
+        if self.size:
+            self.data['done'][self.next - 1] = True
+
+    def sample(self, n, generator):
+        '''n transitions drawn uniformly with replacement (a structured array)'''
+        return self.data[generator.integers(0, self.size, size=n)]
+
+
+def max_batch_states(max_rows):
+    '''
+    Distinct states a batch can look up in a QTable of at most max_rows
+    rows without evicting one of its own rows: an eviction frees the
+    least recently used rows, so the rows just looked up survive as long
+    as enough older rows are left
+    '''
+    if max_rows is None:
+        return None
+    return max_rows - max(1, max_rows // EVICTED_FRACTION)
+
+
+def table_rows(table, state_ids):
+    '''Rows of the states in a QTable, all valid together (see max_batch_states)'''
+    if table.backend == 'dense':
+        return state_ids
+    (unique_ids, inverse) = np.unique(state_ids, return_inverse=True)
+    max_states = max_batch_states(table.index.max_rows)
+    if max_states is not None and len(unique_ids) > max_states:
+        raise ValueError('{} states in one batch, a table of {} rows only keeps {}'.format(
+            len(unique_ids), table.index.max_rows, max_states))
+    rows = np.array([table.row(int(state_id)) for state_id in unique_ids], dtype=np.int64)
+    return rows[inverse]
+
+
+class TabularModel(object):
+    '''
+    Mean reward of every (state, action), stored like Q-values (see qtable)
+    '''
+    def __init__(self, n_states, n_actions, backend='dense', max_states=None):
+        self.rewards = QTable(n_states, n_actions, 0., backend=backend, max_rows=max_states)
+
+    def observe(self, state, action, reward):
+        self.rewards.update(self.rewards.row(state), action, reward)
+
+    def meanRewards(self, states, actions):
+        return self.rewards.q[table_rows(self.rewards, states), actions]
+
+
+def plan(table, model, transitions, gamma=0., bootstrap=True):
+    '''
+    One batched update of a QTable from transitions of a ReplayBuffer:
+    target = mean reward of the model (+ gamma * max Q of the next state
+    if bootstrap and the episode goes on)
+    '''
+    n = len(transitions)
+    states = transitions['state']
+    if bootstrap:  # look up every row before reading Q: a lookup may evict rows
+        states = np.concatenate((states, transitions['next_state']))
+    all_rows = table_rows(table, states)
+    rows = all_rows[:n]
+    targets = model.meanRewards(transitions['state'], transitions['action'])
+    if bootstrap:
+        next_rows = all_rows[n:]
+        next_values = table.q[next_rows, table.greedy[next_rows]]
+        targets = targets + gamma * np.where(transitions['done'], 0., next_values)
+    table.updateBatch(rows, transitions['action'], targets)
@@ -0,0 +1,107 @@
+'''
+Seeded, buffered random numbers.
+
+A RandomService is created for every run from a seed (or a SeedSequence).
+Every object that needs randomness (agents, environments) asks it for
+its own RandomStream: streams are spawned from the run SeedSequence,
+so they are reproducible and independent of each other.
+
+A RandomStream pre-draws uniform and integer samples from its numpy
+Generator in blocks and hands them out one at a time as plain Python
+numbers, which is much cheaper than one numpy call per draw.
+
+The module keeps a current service, replaced by seed() at the start of
+each run; stream() and generator() spawn from it.
+'''
+
+import numpy as np
+
+BLOCK_SIZE = 1024
+
+
+class RandomStream(object):
+    '''
+    Scalar draws served from pre-drawn blocks of one Generator
+    '''
+    def __init__(self, seed_seq, block_size=BLOCK_SIZE):
+        self.generator = np.random.Generator(np.random.PCG64(seed_seq))
+        self.block_size = block_size
+        self.uniforms = []
+        self.int_blocks = {}  # (low, high) -> block of pre-drawn integers
+
+    def uniform(self):
+        '''Float in [0, 1)'''
+        if not self.uniforms:
+            self.uniforms = self.generator.random(self.block_size).tolist()
+        return self.uniforms.pop()
+
+    def randint(self, low, high):
+        '''Integer in [low, high)'''
+        block = self.int_blocks.get((low, high))
+        if not block:
+            block = self.int_blocks[low, high] = self.generator.integers(
+                low, high, size=self.block_size).tolist()
+        return block.pop()
+
+    def choice(self, seq):
+        '''Uniformly chosen element of a sequence'''
+        return seq[self.randint(0, len(seq))]
+
+    def getState(self):
+        '''Generator state and pre-drawn samples, as plain (JSON-friendly) Python objects'''
+        return {'bit_generator': self.generator.bit_generator.state, 'block_size': self.block_size,
+                'uniforms': list(self.uniforms),
+                'int_blocks': [[low, high, list(block)] for (low, high), block in self.int_blocks.items()]}
+
+    def setState(self, state):
+        self.generator.bit_generator.state = state['bit_generator']
+        self.block_size = state['block_size']
+        self.uniforms = list(state['uniforms'])
+        self.int_blocks = {(low, high): list(block) for (low, high, block) in state['int_blocks']}
+
+    def categorical(self, p):
+        '''Index drawn with probabilities p (which should sum to 1)'''
+        cdf = np.cumsum(p)
+        i = int(np.searchsorted(cdf, self.uniform() * cdf[-1], side='right'))
+        return min(i, len(p) - 1)
+
+
+class RandomService(object):
+    '''
+    Source of the independent random streams of one run
+    '''
+    def __init__(self, seed=None):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_seq = seed
+        else:
+            self.seed_seq = np.random.SeedSequence(seed)
+
+    def stream(self, block_size=BLOCK_SIZE):
+        '''New buffered stream, independent from all previous ones'''
+        return RandomStream(self.seed_seq.spawn(1)[0], block_size)
+
+    def generator(self):
+        '''New unbuffered Generator, for array draws'''
+        return np.random.Generator(np.random.PCG64(self.seed_seq.spawn(1)[0]))
+
+
+_service = RandomService()
+
+
+def seed(seed=None):
+    '''Start a new run: replace the current service'''
+    global _service
+    _service = RandomService(seed)
+    return _service
+
+
+def service():
+    return _service
+
+
+def stream(block_size=BLOCK_SIZE):
+    return _service.stream(block_size)
+
+
+def generator():
+    return _service.generator()
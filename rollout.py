@@ -0,0 +1,59 @@
+'''
+Online planning by Monte-Carlo rollouts.
+
+Before every action, a RolloutAgent takes a snapshot of its Environment
+(see Environment.snapshot: three integers for a classic world) and copies
+it into every world of a VecEnvironment. Each of the N_ACTIONS actions
+starts n_rollouts / N_ACTIONS of these worlds; all of them then go on
+together for depth - 1 steps of random actions, one array step per
+depth. The agent plays the first action with the best mean discounted
+return. A decision costs depth VecEnvironment steps, whatever the number
+of rollouts.
+
+Like solver.OptimalAgent, the agent sees the whole world (the Wumpus
+position is in the snapshot). Rollouts simulate the classic world only.
+'''
+
+import numpy as np
+
+import rng
+from vec_env import VecEnvironment
+from wumpus_text import Agent, N_ACTIONS
+
+
+class RolloutAgent(Agent):
+    '''
+    Flat Monte-Carlo planner, see above
+    '''
+    def __init__(self, n_rollouts=1024, depth=10, gamma=0.95):
+        self.n_per_action = max(1, n_rollouts // N_ACTIONS)
+        self.depth = depth
+        self.gamma = gamma
+        self.random_ = rng.generator()
+        self.first_actions = np.repeat(np.arange(1, N_ACTIONS + 1), self.n_per_action)
+        Agent.__init__(self)
+
+    def observeWorld(self, environment):
+        if environment.world_ is not None:
+            raise ValueError('rollouts only simulate the classic world')
+        self.environment = environment
+        self.simulator = VecEnvironment(len(self.first_actions), environment.my_args_)
+
+    def actionValues(self):
+        '''Mean discounted return of the rollouts started by every action'''
+        simulator = self.simulator
+        simulator.restoreWorlds(slice(None), self.environment.snapshot())
+        (states, rewards, ended) = simulator.step(self.first_actions)
+        returns = rewards
+        running = ~ended  # ended rollouts are reset by the simulator: ignore what follows
+        discount = 1.
+        for i in range(self.depth - 1):
+            discount *= self.gamma
+            actions = self.random_.integers(1, N_ACTIONS + 1, size=len(running))
+            (states, rewards, ended) = simulator.step(actions)
+            returns += discount * rewards * running
+            running &= ~ended
+        return returns.reshape(N_ACTIONS, self.n_per_action).mean(axis=1)
+
+    def getAction(self):
+        return 1 + int(self.actionValues().argmax())
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Wumpus worlds served over a socket, for agents living in other processes
+
+The server hosts the worlds of one VecEnvironment. Clients talk to it
+with one JSON object per line; every request may carry an "id", copied
+into its answer (answers of one connection can come out of order):
+  {"op": "reset", "n": 4}                   -> {"envs": [...], "states": [...]}
+  {"op": "reset", "envs": [0, 1]}           -> {"envs": [...], "states": [...]}
+  {"op": "step", "env": 0, "action": 3}     -> {"state": [...], "reward": r, "done": d}
+  {"op": "batch_step", "envs": [0, 1], "actions": [3, 5]}
+                                            -> {"states": [...], "rewards": [...], "dones": [...]}
+  {"op": "close", "envs": [0, 1]}           -> {}
+States are (x, y, smell, breeze, remaining shots). "reset" with "n" gives
+the client n new worlds, which it owns until it closes them or
+disconnects. Errors are answered as {"error": message}.
+
+Step requests of all connections that arrive together (within --delay
+seconds) are applied with one VecEnvironment.stepWorlds call.
+
+Usage: server [-H <host>] [-p <port>] [-n <int>] [-b <float>] [-q <int>] [-D <int>] [--] [<wumpus_option>...]
+
+Options:
+-h --help      Show the description of the program
+-H <host> --host <host>   the address to listen on [default: 127.0.0.1]
+-p <port> --port <port>   the port to listen on, 0 for any [default: 5555]
+-n <int> --n_envs <int>   the number of worlds hosted [default: 4096]
+-b <float> --delay <float>   the time to wait for more step requests before a batch, in seconds [default: 0]
+-q <int> --seed <int>   the seed of the worlds [default: 0]
+-D <int> --demo <int>   run <int> local clients against the server for a few seconds and exit, 0 to serve forever [default: 0]
+
+<wumpus_option> are options of wumpus_text, e.g. -- --grid_size=8 --wumpus_dyn=True
+"""
+
+from __future__ import print_function
+
+import asyncio
+import json
+import time
+import numpy as np
+from docopt import docopt
+
+import wumpus_text
+from vec_env import VecEnvironment
+
+
+class EnvServer(object):
+    '''
+    Worlds of a VecEnvironment shared by the clients, with batched steps
+    '''
+    def __init__(self, my_args, n_envs=4096, seed=None, delay=0.):
+        self.env = VecEnvironment(n_envs, my_args, seed)
+        self.delay = delay
+        self.free = list(range(n_envs - 1, -1, -1))
+        self.pending = []  # (world ids, actions, future) waiting for the next batch
+        self.flush_scheduled = False
+        self.n_batches = 0
+        self.n_steps = 0
+
+    async def serve(self, host, port):
+        return await asyncio.start_server(self.handleClient, host, port)
+
+    async def handleClient(self, reader, writer):
+        owned = set()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.answer(line, owned, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            self.release(owned)  # the worlds of a lost client go back to the pool
+            writer.close()
+
+    async def answer(self, line, owned, writer):
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            result = await self.dispatch(request, owned)
+        except (KeyError, ValueError, TypeError) as error:
+            result = {'error': '{}: {}'.format(type(error).__name__, error)}
+        if isinstance(request, dict) and 'id' in request:
+            result['id'] = request['id']
+        writer.write((json.dumps(result) + '\n').encode('utf-8'))
+        await writer.drain()
+
+    def checkOwned(self, ids, owned):
+        ids = [int(i) for i in ids]
+        for i in ids:
+            if i not in owned:
+                raise KeyError('world {} is not yours'.format(i))
+        if len(set(ids)) != len(ids):
+            raise ValueError('a world appears twice')
+        return ids
+
+    async def dispatch(self, request, owned):
+        op = request['op']
+        if op == 'reset':
+            if 'envs' in request:
+                ids = self.checkOwned(request['envs'], owned)
+            else:
+                ids = self.allocate(int(request.get('n', 1)))
+                owned.update(ids)
+            self.env.resetWorlds(ids)
+            return {'envs': ids, 'states': self.env.getStates()[ids].tolist()}
+        if op == 'step':
+            (ids, actions) = (self.checkOwned([request['env']], owned), [int(request['action'])])
+        elif op == 'batch_step':
+            (ids, actions) = (self.checkOwned(request['envs'], owned), [int(a) for a in request['actions']])
+        elif op == 'close':
+            ids = self.checkOwned(request['envs'], owned)
+            owned.difference_update(ids)
+            self.release(ids)
+            return {}
+        else:
+            raise ValueError('unknown op {}'.format(op))
+        if len(actions) != len(ids) or not all(1 <= a <= wumpus_text.N_ACTIONS for a in actions):
+            raise ValueError('one action in 1..{} per world expected'.format(wumpus_text.N_ACTIONS))
+        (states, rewards, dones) = await self.submit(ids, actions)
+        if op == 'step':
+            return {'state': states[0], 'reward': rewards[0], 'done': dones[0]}
+        return {'states': states, 'rewards': rewards, 'dones': dones}
+
+    def allocate(self, n):
+        if n < 1:
+            raise ValueError('at least one world must be asked for')
+        if n > len(self.free):
+            raise ValueError('only {} free worlds left'.format(len(self.free)))
+        ids = self.free[-n:][::-1]
+        del self.free[-n:]
+        return ids
+
+    def release(self, ids):
+        self.free.extend(sorted(ids, reverse=True))
+
+    def submit(self, ids, actions):
+        '''Future of the step of some worlds, done with the next batch'''
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((ids, actions, future))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            if self.delay > 0:
+                asyncio.get_event_loop().call_later(self.delay, self.flush)
+            else:
+                asyncio.get_event_loop().call_soon(self.flush)
+        return future
+
+    def flush(self):
+        '''Step all the pending worlds at once (a world twice waits for the next batch)'''
+        self.flush_scheduled = False
+        (batch, deferred, stepped) = ([], [], set())
+        for request in self.pending:
+            if stepped.isdisjoint(request[0]):
+                stepped.update(request[0])
+                batch.append(request)
+            else:
+                deferred.append(request)
+        self.pending = []
+        ids = np.concatenate([request[0] for request in batch])
+        actions = np.concatenate([request[1] for request in batch])
+        (states, rewards, dones) = self.env.stepWorlds(ids, actions)
+        (states, rewards, dones) = (states.tolist(), rewards.tolist(), dones.tolist())
+        start = 0
+        for (request_ids, _, future) in batch:
+            end = start + len(request_ids)
+            if not future.cancelled():
+                future.set_result((states[start:end], rewards[start:end], dones[start:end]))
+            start = end
+        self.n_batches += 1
+        self.n_steps += len(ids)
+        for (request_ids, request_actions, future) in deferred:
+            self.pending.append((request_ids, request_actions, future))
+        if self.pending and not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_event_loop().call_soon(self.flush)
+
+
+class EnvClient(object):
+    '''
+    Client of an EnvServer (in the same or another process), e.g.
+        client = EnvClient(); await client.connect(host, port)
+        (envs, states) = await client.reset(n=16)
+        (states, rewards, dones) = await client.batchStep(envs, actions)
+    Several requests can be in flight at once on one connection.
+    '''
+    def __init__(self):
+        self.futures = {}
+        self.next_id = 0
+
+    async def connect(self, host='127.0.0.1', port=5555):
+        (self.reader, self.writer) = await asyncio.open_connection(host, port)
+        self.reading = asyncio.ensure_future(self.readAnswers())
+
+    async def readAnswers(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            answer = json.loads(line)
+            self.futures.pop(answer.pop('id')).set_result(answer)
+
+    async def request(self, **request):
+        request['id'] = self.next_id
+        self.next_id += 1
+        future = self.futures[request['id']] = asyncio.get_event_loop().create_future()
+        self.writer.write((json.dumps(request) + '\n').encode('utf-8'))
+        answer = await future
+        if 'error' in answer:
+            raise RuntimeError(answer['error'])
+        return answer
+
+    async def reset(self, n=1, envs=None):
+        if envs is None:
+            answer = await self.request(op='reset', n=n)
+        else:
+            answer = await self.request(op='reset', envs=list(envs))
+        return (answer['envs'], answer['states'])
+
+    async def step(self, env, action):
+        answer = await self.request(op='step', env=env, action=int(action))
+        return (answer['state'], answer['reward'], answer['done'])
+
+    async def batchStep(self, envs, actions):
+        answer = await self.request(op='batch_step', envs=list(envs), actions=[int(a) for a in actions])
+        return (answer['states'], answer['rewards'], answer['dones'])
+
+    async def close(self, envs=None):
+        if envs:
+            await self.request(op='close', envs=list(envs))
+        self.writer.close()
+        self.reading.cancel()
+
+
+async def random_client(host, port, n_worlds, duration, seed):
+    '''Play random actions in n_worlds worlds (one step request per world) for duration seconds'''
+    random = np.random.default_rng(seed)
+    client = EnvClient()
+    await client.connect(host, port)
+    (envs, states) = await client.reset(n_worlds)
+    total = 0.
+    end = time.time() + duration
+    while time.time() < end:
+        actions = random.integers(1, wumpus_text.N_ACTIONS + 1, size=n_worlds)
+        results = await asyncio.gather(*[client.step(env, a) for (env, a) in zip(envs, actions)])
+        total += sum(reward for (state, reward, done) in results)
+    await client.close(envs)
+    return total
+
+
+async def demo(server, host, n_clients, n_worlds=64, duration=3.):
+    tcp_server = await server.serve(host, 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+    start = time.time()
+    await asyncio.gather(*[random_client(host, port, n_worlds, duration, k) for k in range(n_clients)])
+    elapsed = time.time() - start
+    tcp_server.close()
+    await tcp_server.wait_closed()
+    print('{} clients x {} worlds: {:.0f} steps/s, {:.1f} steps per batch'.format(
+        n_clients, n_worlds, server.n_steps / elapsed, server.n_steps / max(1, server.n_batches)))
+
+
+async def serve_forever(server, host, port):
+    tcp_server = await server.serve(host, port)
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+if __name__ == "__main__":
+
+    my_args = docopt(__doc__)
+    world_args = docopt(wumpus_text.__doc__, argv=my_args['<wumpus_option>'])
+    server = EnvServer(world_args, int(my_args['--n_envs']), int(my_args['--seed']), float(my_args['--delay']))
+    if int(my_args['--demo']):
+        asyncio.run(demo(server, my_args['--host'], int(my_args['--demo'])))
+    else:
+        asyncio.run(serve_forever(server, my_args['--host'], int(my_args['--port'])))
@@ -0,0 +1,248 @@
+'''
+Exact model-based solver for the Wumpus world.
+
+The dynamics of wumpus_text.Environment are fully known, so the optimal
+policy over the full state (agent cell, Wumpus position, flashes left)
+can be computed by dynamic programming instead of learned.
+
+The transition tensor is stored factored: an agent step is deterministic
+given the action (index tables), the Wumpus random walk is a sparse
+stochastic matrix over Wumpus positions, and an episode end sends the
+world back to its initial state. Value and policy iteration work on
+whole arrays of states at once.
+
+Wumpus positions include the off-grid ones the Environment produces
+when a dead Wumpus keeps moving (see Environment.moveAgent): positions
+left of the grid never come back and are merged into one, positions
+below the grid are kept down to max_depth rows.
+
+OptimalAgent plays the optimal policy. It reads the Wumpus position
+from the environment, so it is an upper bound for the learning agents
+of tp4, which only observe smell and breeze.
+'''
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from wumpus_text import Agent, Action, FLASH_MASK, FLASH_TARGET, WUMPUS_INIT_POS
+
+DEAD = (-1, -1)
+GONE = (-2, -2)  # any position left of the grid: unreachable forever
+
+
+class WumpusMDP(object):
+    '''
+    The Wumpus world of an Environment as a Markov decision process.
+
+    States are indexed by (wumpus, agent cell, flashes left), flattened
+    in that order (C-style).
+    '''
+    def __init__(self, environment, max_depth=4):
+        if environment.world_ is not None:
+            raise ValueError('the solver only handles the classic world (one hole, one Wumpus)')
+        self.env = environment
+        self.max_depth = max_depth
+        (gx, gy) = environment.getGridSize()
+        self.n_cells = gx * gy
+        self.n_f = environment.DEFAULT_N_FLASH + 1
+        self.cell_pos = np.array([[c // gy, c % gy] for c in range(self.n_cells)])
+
+        # Wumpus positions reachable from its initial position (and from its death)
+        init_wumpus = WUMPUS_INIT_POS
+        self.wumpus_pos = [init_wumpus, DEAD]
+        self.wumpus_index = {init_wumpus: 0, DEAD: 1}
+        moves = range(1, 4) if environment.DYN_WUMPUS else []  # same range as Environment.moveWumpus
+        rows, cols = [], []
+        i = 0
+        while i < len(self.wumpus_pos):
+            pos = self.wumpus_pos[i]
+            for a in moves:
+                j = self.addWumpusPosition(environment.moveAgent(list(pos), Action(a)))
+                rows.append(i)
+                cols.append(j)
+            i += 1
+        self.n_w = len(self.wumpus_pos)
+        if environment.DYN_WUMPUS:
+            self.wumpus_kernel = scipy.sparse.csr_matrix(
+                (np.full(len(rows), 1. / len(moves)), (rows, cols)), shape=(self.n_w, self.n_w))
+        else:
+            self.wumpus_kernel = scipy.sparse.identity(self.n_w, format='csr')
+
+        self.n_states = self.n_w * self.n_cells * self.n_f
+        self.init_state = self.stateIndex(init_wumpus, (0, 0), environment.DEFAULT_N_FLASH)
+        self.buildTables()
+
+    def canonical(self, pos):
+        if pos[0] <= -2:
+            return GONE
+        if pos[1] < -self.max_depth:
+            return (pos[0], -self.max_depth)
+        return (pos[0], pos[1])
+
+    def addWumpusPosition(self, pos):
+        pos = self.canonical(pos)
+        if pos not in self.wumpus_index:
+            self.wumpus_index[pos] = len(self.wumpus_pos)
+            self.wumpus_pos.append(pos)
+        return self.wumpus_index[pos]
+
+    def stateIndex(self, wumpus_pos, agent_pos, n_flash):
+        w = self.wumpus_index[self.canonical(wumpus_pos)]
+        cell = agent_pos[0] * self.env.getGridSize()[1] + agent_pos[1]
+        return (w * self.n_cells + cell) * self.n_f + n_flash
+
+    def buildTables(self):
+        '''
+        For every action: reward, end flag and index of the state reached
+        before the Wumpus moves (into the value averaged over its moves)
+        '''
+        env = self.env
+        gy = env.getGridSize()[1]
+        w = np.arange(self.n_w)[:, None, None]
+        cell = np.arange(self.n_cells)[None, :, None]
+        f = np.arange(self.n_f)[None, None, :]
+        wumpus = np.array(self.wumpus_pos)
+        (wx, wy) = (wumpus[w, 0], wumpus[w, 1])
+        (ax, ay) = (self.cell_pos[cell, 0], self.cell_pos[cell, 1])
+        hole_cell = env.getHolePosition()[0] * gy + env.getHolePosition()[1]
+        treasure_cell = env.getTreasurePosition()[0] * gy + env.getTreasurePosition()[1]
+        shape = (self.n_w, self.n_cells, self.n_f)
+
+        self.rewards = np.empty((len(Action),) + shape)
+        self.ends = np.empty((len(Action),) + shape, dtype=bool)
+        self.next_index = np.empty((len(Action),) + shape, dtype=np.int64)
+        for a in Action:
+            if a < Action.FLASH_UP:
+                next_cell = np.array([env.moveAgent(list(pos), a) for pos in self.cell_pos])
+                next_cell = (next_cell[:, 0] * gy + next_cell[:, 1])[cell]
+                (next_f, killed) = (f, np.zeros(shape, dtype=bool))
+            else:
+                (dx, dy) = FLASH_TARGET[a]
+                next_cell = cell
+                next_f = np.maximum(f - 1, 0)
+                killed = (f > 0) & (wx >= 0) & (wx == ax + dx) & (wy == ay + dy)
+            next_w = np.where(killed, self.wumpus_index[DEAD], w)
+            (nwx, nwy) = (wumpus[next_w, 0], wumpus[next_w, 1])
+            met_wumpus = (nwx == self.cell_pos[next_cell, 0]) & (nwy == self.cell_pos[next_cell, 1])
+            in_hole = ~met_wumpus & (next_cell == hole_cell)
+            on_treasure = ~met_wumpus & ~in_hole & (next_cell == treasure_cell)
+            self.rewards[a - 1] = (env.DEFAULT_REWARD + env.KILL_REWARD * killed
+                                   + env.WUMPUS_REWARD * met_wumpus + env.HOLE_REWARD * in_hole
+                                   + env.TREASURE_REWARD * on_treasure)
+            self.ends[a - 1] = met_wumpus | in_hole | on_treasure
+            self.next_index[a - 1] = (next_w * self.n_cells + next_cell) * self.n_f + next_f
+        self.rewards = self.rewards.reshape(len(Action), -1)
+        self.ends = self.ends.reshape(len(Action), -1)
+        self.next_index = self.next_index.reshape(len(Action), -1)
+        # Same, with index n_states standing for the initial state after an end
+        self.successor = np.where(self.ends, self.n_states, self.next_index)
+
+    def qValues(self, v, gamma):
+        '''Q[a, s] for the value function v'''
+        # Expected value after the Wumpus move, for every pre-move state
+        u = np.append(self.wumpus_kernel @ v.reshape(self.n_w, -1), v[self.init_state])
+        return self.rewards + gamma * u[self.successor]
+
+    def transitionMatrix(self, policy):
+        '''Sparse P[s, s'] of a policy (array of action indices, 0-based)'''
+        states = np.arange(self.n_states)
+        ends = self.ends[policy, states]
+        pre = self.next_index[policy, states]
+        (next_w, rest) = np.divmod(pre, self.n_cells * self.n_f)
+        kernel = self.wumpus_kernel
+        counts = np.where(ends, 1, np.diff(kernel.indptr)[next_w])
+        rows = np.repeat(states, counts)
+        # position of every entry within its row, to walk the kernel row of next_w
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        k = np.repeat(kernel.indptr[next_w], counts) + offsets
+        end_rows = np.repeat(ends, counts)
+        k[end_rows] = 0
+        cols = np.where(end_rows, self.init_state,
+                        kernel.indices[k] * self.n_cells * self.n_f + np.repeat(rest, counts))
+        data = np.where(end_rows, 1., kernel.data[k])
+        return scipy.sparse.csr_matrix((data, (rows, cols)), shape=(self.n_states, self.n_states))
+
+    def valueIteration(self, gamma=0.99, tol=1e-3, max_iter=100000):
+        '''
+        Return (values, policy). Stops when the span of the value update
+        is below tol, which bounds the loss of the greedy policy.
+        '''
+        v = np.zeros(self.n_states)
+        for i in range(max_iter):
+            q = self.qValues(v, gamma)
+            v_next = q.max(axis=0)
+            delta = v_next - v
+            v = v_next
+            if delta.max() - delta.min() < tol:
+                break
+        return (v, self.qValues(v, gamma).argmax(axis=0))
+
+    def policyIteration(self, gamma=0.99, max_iter=1000):
+        '''Return (values, policy), evaluating each policy with a sparse solve'''
+        policy = np.zeros(self.n_states, dtype=np.int64)
+        identity = scipy.sparse.identity(self.n_states, format='csr')
+        states = np.arange(self.n_states)
+        for i in range(max_iter):
+            p = self.transitionMatrix(policy)
+            v = scipy.sparse.linalg.spsolve((identity - gamma * p).tocsc(), self.rewards[policy, states])
+            q = self.qValues(v, gamma)
+            # keep the current action on ties so that the iteration stops
+            q_policy = q[policy, states]
+            improved = q.max(axis=0) > q_policy + 1e-9 * np.abs(q_policy)
+            if not improved.any():
+                break
+            policy = np.where(improved, q.argmax(axis=0), policy)
+        return (v, policy)
+
+    def averageReward(self, policy, n_steps):
+        '''Expected average reward per step over the first n_steps of a run'''
+        states = np.arange(self.n_states)
+        p_t = self.transitionMatrix(policy).T.tocsr()
+        r = self.rewards[policy, states]
+        d = np.zeros(self.n_states)
+        d[self.init_state] = 1.
+        total = 0.
+        for t in range(n_steps):
+            total += d @ r
+            d = p_t @ d
+        return total / n_steps
+
+
+_solutions = {}
+
+
+def solve(environment, gamma=0.99, method='value'):
+    '''
+    Optimal (mdp, values, policy) for the world of an environment,
+    cached per process for identical worlds
+    '''
+    key = (environment.getGridSize(), environment.DEFAULT_N_FLASH, environment.TORE_TOPO,
+           environment.DYN_WUMPUS, environment.getHolePosition(), environment.getTreasurePosition(),
+           gamma, method)
+    if key not in _solutions:
+        mdp = WumpusMDP(environment)
+        if method == 'policy':
+            (v, policy) = mdp.policyIteration(gamma)
+        else:
+            (v, policy) = mdp.valueIteration(gamma)
+        _solutions[key] = (mdp, v, policy)
+    return _solutions[key]
+
+
+class OptimalAgent(Agent):
+    '''
+    Plays the optimal policy of the full-state MDP (sees the Wumpus)
+    '''
+    def __init__(self, gamma=0.99, method='value'):
+        self.gamma = gamma
+        self.method = method
+        Agent.__init__(self)
+
+    def observeWorld(self, environment):
+        self.environment = environment
+        (self.mdp, self.values, self.policy) = solve(environment, self.gamma, self.method)
+
+    def getAction(self):
+        s = self.mdp.stateIndex(self.environment.getWumpusPosition(), self.getPosition(), self.state_ & FLASH_MASK)
+        return 1 + self.policy[s]
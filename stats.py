@@ -0,0 +1,147 @@
+'''
+Streaming reward statistics.
+
+RewardStats replaces the list of all rewards of a run: it keeps the
+mean/variance of step rewards and of episode returns with Welford's
+online algorithm, and the cumulative reward sampled at a fixed number
+of points. Memory does not depend on the number of steps.
+'''
+
+import numpy as np
+
+
+class Welford(object):
+    '''
+    Online mean and variance
+    '''
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def var(self):
+        return self.m2 / self.n if self.n else 0.
+
+    def std(self):
+        return np.sqrt(self.var())
+
+
+class RewardStats(object):
+    '''
+    Statistics of the rewards of one run.
+
+    The cumulative reward curve holds at most `resolution` points, one
+    every `bin_size` steps. When more steps than expected come in,
+    bin_size is doubled and every other point is dropped.
+    '''
+    def __init__(self, n_steps=None, resolution=1000):
+        resolution |= 1  # odd, so that points stay on bin boundaries through coarsen()
+        self.resolution = resolution
+        self.bin_size = max(1, -(-int(n_steps or resolution) // resolution))
+        self.curve = np.zeros(resolution)  # cumulative reward after (i+1)*bin_size steps
+        self.n_points = 0
+
+        self.rewards = Welford()
+        self.returns = Welford()  # total reward of each finished episode
+        self.lengths = Welford()  # number of steps of each finished episode
+        self.total = 0.
+        self.episode_total = 0.
+        self.episode_length = 0
+
+    def add(self, reward, end_flag=False):
+        self.rewards.add(reward)
+        self.total += reward
+        self.episode_total += reward
+        self.episode_length += 1
+        if end_flag:
+            self.returns.add(self.episode_total)
+            self.lengths.add(self.episode_length)
+            self.episode_total = 0.
+            self.episode_length = 0
+        if self.rewards.n % self.bin_size == 0:
+            if self.n_points == self.resolution:
+                self.coarsen()
+            self.curve[self.n_points] = self.total
+            self.n_points += 1
+
+    def coarsen(self):
+        '''Halve the number of curve points by doubling the bin size'''
+        kept = self.curve[1:self.n_points:2]
+        self.curve[:len(kept)] = kept
+        self.curve[len(kept):] = 0.
+        self.n_points = len(kept)
+        self.bin_size *= 2
+
+    def nSteps(self):
+        return self.rewards.n
+
+    def nEpisodes(self):
+        return self.returns.n
+
+    def mean(self):
+        '''Average reward per step'''
+        return self.rewards.mean
+
+    def std(self):
+        return self.rewards.std()
+
+    def getState(self):
+        '''Everything needed to rebuild these statistics (see from_state), as numpy arrays'''
+        counters = [self.rewards, self.returns, self.lengths]
+        return {'curve': self.curve[:self.n_points].copy(),
+                'welford': np.array([[c.n, c.mean, c.m2] for c in counters], dtype=float),
+                'sizes': np.array([self.resolution, self.bin_size, self.episode_length]),
+                'totals': np.array([self.total, self.episode_total])}
+
+    def curveSteps(self):
+        return self.bin_size * np.arange(1, self.n_points + 1)
+
+    def cumulativeCurve(self):
+        '''(steps, cumulative reward at those steps)'''
+        return (self.curveSteps(), self.curve[:self.n_points])
+
+
+def from_state(state):
+    '''Rebuild a RewardStats from RewardStats.getState()'''
+    stats = RewardStats.__new__(RewardStats)
+    (stats.resolution, stats.bin_size, stats.episode_length) = [int(x) for x in state['sizes']]
+    (stats.total, stats.episode_total) = [float(x) for x in state['totals']]
+    stats.n_points = len(state['curve'])
+    stats.curve = np.zeros(stats.resolution)
+    stats.curve[:stats.n_points] = state['curve']
+    (stats.rewards, stats.returns, stats.lengths) = (Welford(), Welford(), Welford())
+    for (counter, (n, mean, m2)) in zip([stats.rewards, stats.returns, stats.lengths], state['welford']):
+        (counter.n, counter.mean, counter.m2) = (int(n), float(mean), float(m2))
+    return stats
+
+
+def summarize_runs(runs_stats):
+    '''
+    Combine the RewardStats of several runs of the same length.
+
+    Return (mean reward/step, std of per-run means, steps, mean cumulative curve)
+    '''
+    means = np.array([stats.mean() for stats in runs_stats])
+    n_points = min(stats.n_points for stats in runs_stats)
+    steps = runs_stats[0].curveSteps()[:n_points]
+    curve = np.mean([stats.curve[:n_points] for stats in runs_stats], axis=0)
+    return (means.mean(), means.std(), steps, curve)
+
+
+def mean_interval(values, level=0.95):
+    '''
+    (mean, half width of its Student t confidence interval at level) of
+    independent values, e.g. the average rewards of several runs
+    '''
+    from scipy.stats import t  # scipy is only needed for confidence intervals
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2:
+        return (values.mean(), np.inf)
+    return (values.mean(), t.ppf((1 + level) / 2, n - 1) * values.std(ddof=1) / np.sqrt(n))
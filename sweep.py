@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Hyperparameter sweeps with successive halving
+
+A search space is a list of families: an agent spec template and the
+values of its parameters, e.g.
+  ["tp4.EpsilonGreedy({epsilon}, {encoding})",
+   {"epsilon": [0.01, 0.1, 0.5], "encoding": ["tp4.BSF(n_flash)", "tp4.ABSF(n_flash)"]}]
+Grid search takes every combination of values; random search draws
+--n_configs configs, a value being either a list to choose from or
+["uniform", low, high] / ["log", low, high].
+
+Every config is first run for --min_steps steps; the best 1/--eta of them
+(by average reward over --runs runs) are run again with --eta times more
+steps, and so on up to --max_n_episode steps of the world options. A
+config keeps the same seeds at every rung. Results go to one table, CSV or
+JSON according to the extension of --out.
+
+Usage: sweep [-m <name>] [-c <int>] [-b <int>] [-a <int>] [-p <path>] [-o <path>] [-q <int>] [--] [<wumpus_option>...]
+
+Options:
+-h --help      Show the description of the program
+-m <name> --search <name>   grid or random [default: grid]
+-c <int> --n_configs <int>   the number of configs of a random search [default: 20]
+-b <int> --min_steps <int>   the number of steps of the first rung [default: 1000]
+-a <int> --eta <int>   the factor between the number of configs (and steps) of two rungs [default: 3]
+-p <path> --space <path>   a JSON file with the search space, the space of the examples of wumpus_text if empty [default: ]
+-o <path> --out <path>   the results table, .csv or .json [default: sweep_results.csv]
+-q <int> --seed <int>   the seed of the random search [default: 0]
+
+<wumpus_option> are options of wumpus_text, e.g. -- --grid_size=8 --runs=5 -e 100000
+"""
+
+from __future__ import print_function
+
+import csv
+import itertools
+import json
+import math
+import numpy as np
+from docopt import docopt
+
+import experiment
+import wumpus_text
+
+ENCODINGS = ['tp4.BSF(n_flash)', 'tp4.ABSF(n_flash)', 'tp4.XYBSF(grid_size, n_flash)']
+
+# The sweeps of the __main__ of wumpus_text
+DEFAULT_SPACE = [
+    ['tp4.EpsilonGreedy({epsilon}, {encoding})',
+     {'epsilon': [0.01, 0.1, 0.2, 0.4, 0.6, 0.8], 'encoding': ENCODINGS}],
+    ['tp4.Softmax({temperature}, {encoding})',
+     {'temperature': [0.1, 1, 10, 40], 'encoding': ENCODINGS}],
+    ['tp4.UCB({lbda}, {encoding})',
+     {'lbda': [1e-2, 1e-1, 1, 10], 'encoding': ENCODINGS}],
+]
+
+
+def grid_configs(space):
+    '''Every (template, parameters) of the space'''
+    configs = []
+    for (template, values) in space:
+        names = sorted(values)
+        for combination in itertools.product(*[values[name] for name in names]):
+            configs.append((template, dict(zip(names, combination))))
+    return configs
+
+
+def draw_value(values, random):
+    if isinstance(values[0], str) and values[0] in ('uniform', 'log'):
+        (kind, low, high) = values
+        if kind == 'log':
+            return float(np.exp(random.uniform(np.log(low), np.log(high))))
+        return float(random.uniform(low, high))
+    return values[random.integers(len(values))]
+
+
+def random_configs(space, n_configs, seed):
+    '''n_configs (template, parameters), the family first drawn uniformly'''
+    random = np.random.default_rng(seed)
+    configs = []
+    for i in range(n_configs):
+        (template, values) = space[random.integers(len(space))]
+        configs.append((template, {name: draw_value(values[name], random) for name in sorted(values)}))
+    return configs
+
+
+def rung_budgets(min_steps, max_steps, eta):
+    '''Number of steps of each rung: max_steps / eta^k, ..., max_steps'''
+    n_rungs = 1 + max(0, int(math.floor(math.log(max_steps / min_steps, eta) + 1e-9)))
+    return [max_steps // eta ** (n_rungs - 1 - k) for k in range(n_rungs)]
+
+
+def successive_halving(configs, world_args, budgets, eta):
+    '''
+    Run the configs rung by rung, keeping the best 1/eta of them each time.
+    Return one result dict per config.
+    '''
+    specs = [template.format(**params) for (template, params) in configs]
+    namespace = {'grid_size': int(world_args['--grid_size']), 'n_flash': int(world_args['--n_flash'])}
+    results = [{'config': k, 'spec': spec, 'rung': -1} for k, spec in enumerate(specs)]
+    alive = list(range(len(configs)))
+    for (rung, n_steps) in enumerate(budgets):
+        args = dict(world_args)
+        args['--max_n_episode'] = str(n_steps)
+        all_stats = experiment.run_experiments([specs[k] for k in alive], args, namespace, spec_ids=alive)
+        for (k, runs_stats) in zip(alive, all_stats):
+            means = np.array([stats.mean() for stats in runs_stats])
+            results[k].update(rung=rung, steps=n_steps, mean=means.mean(), std=means.std(),
+                              episodes=float(np.mean([stats.nEpisodes() for stats in runs_stats])))
+        print('rung {}: {} configs x {} steps, best {:.3f} ({})'.format(
+            rung, len(alive), n_steps, max(results[k]['mean'] for k in alive),
+            specs[max(alive, key=lambda k: results[k]['mean'])]))
+        n_kept = max(1, len(alive) // eta)
+        alive = sorted(alive, key=lambda k: -results[k]['mean'])[:n_kept]
+    for (result, (template, params)) in zip(results, configs):
+        result['template'] = template
+        result['params'] = params
+    return sorted(results, key=lambda result: (-result['rung'], -result['mean']))
+
+
+def write_table(results, path):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=1)
+        return
+    columns = ['config', 'rung', 'steps', 'mean', 'std', 'episodes', 'spec']
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for result in results:
+            writer.writerow([result[column] for column in columns])
+
+
+if __name__ == "__main__":
+
+    my_args = docopt(__doc__)
+    world_args = docopt(wumpus_text.__doc__, argv=my_args['<wumpus_option>'])
+    world_args.update({'--hmi': 'False', '--verbose': 'False', '--display': 'False'})
+
+    space = DEFAULT_SPACE
+    if my_args['--space']:
+        with open(my_args['--space']) as f:
+            space = json.load(f)
+    if my_args['--search'] == 'random':
+        configs = random_configs(space, int(my_args['--n_configs']), int(my_args['--seed']))
+    else:
+        configs = grid_configs(space)
+
+    eta = int(my_args['--eta'])
+    budgets = rung_budgets(int(my_args['--min_steps']), int(world_args['--max_n_episode']), eta)
+    results = successive_halving(configs, world_args, budgets, eta)
+    write_table(results, my_args['--out'])
+    for result in results[:10]:
+        print('{:8.3f} +/- {:.3f}  {}'.format(result['mean'], result['std'], result['spec']))
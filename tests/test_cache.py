@@ -0,0 +1,23 @@
+import numpy as np
+
+import cache
+from bench import world_args
+
+
+def test_key_follows_referenced_files(tmp_path):
+    path = tmp_path / 'agent.ckpt'
+    path.write_bytes(b'first')
+    spec = "checkpoint.load_agent('{}')".format(path)
+    (args, seed) = (world_args(), np.random.SeedSequence(0))
+    key = cache.run_key(spec, {}, args, seed)
+    assert cache.run_key(spec, {}, args, seed) == key
+    path.write_bytes(b'second version')
+    assert cache.run_key(spec, {}, args, seed) != key
+
+
+def test_key_ignores_engine():
+    seed = np.random.SeedSequence(0)
+    assert (cache.run_key('Agent()', {}, world_args(engine='indexed'), seed)
+            == cache.run_key('Agent()', {}, world_args(engine='python'), seed))
+    assert (cache.run_key('Agent()', {}, world_args(grid_size=4), seed)
+            != cache.run_key('Agent()', {}, world_args(grid_size=5), seed))
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pytest
+
+import checkpoint
+import experiment
+import rng
+import tp4
+from bench import world_args
+from profiler import PhaseProfiler
+from wumpus_text import RLPlatform
+
+
+def trained_platform(agent, n_steps=2000, **options):
+    rng.seed(0)
+    platform = RLPlatform(agent, world_args(**options))
+    for i in range(n_steps):
+        platform.updateLoop()
+    return platform
+
+
+def actions(agent, n=200):
+    return [agent.getAction() for i in range(n)]
+
+
+@pytest.mark.parametrize('make_agent', [
+    lambda: tp4.EpsilonGreedy(0.3, tp4.XYBSF(4, 5), 'qlearning'),
+    lambda: tp4.Softmax(10., tp4.ABSF(5), backend='hashed'),
+    lambda: tp4.UCB(1., tp4.BSF(5)),
+    lambda: tp4.Dyna(0.3, tp4.XYBSF(4, 5), n_planning=4, backend='hashed', max_states=64),
+])
+def test_checkpoint_round_trip(tmp_path, make_agent):
+    agent = trained_platform(make_agent()).agent
+    path = str(tmp_path / 'agent.ckpt')
+    checkpoint.save_agent(agent, path)
+    loaded = checkpoint.load_agent(path)
+    assert type(loaded) is type(agent)
+    for (name, array) in agent.table.getState()[1].items():
+        np.testing.assert_array_equal(loaded.table.getState()[1][name], array, err_msg=name)
+    assert (loaded.state_, loaded.state_row, loaded.pending) == (agent.state_, agent.state_row, agent.pending)
+    # same table, state and random stream: the same actions
+    assert actions(loaded) == actions(agent)
+
+
+def test_read_only_checkpoint_does_not_learn(tmp_path):
+    agent = trained_platform(tp4.EpsilonGreedy(0.3, tp4.XYBSF(4, 5))).agent
+    path = str(tmp_path / 'agent.ckpt')
+    checkpoint.save_agent(agent, path)
+    size = os.path.getsize(path)
+    platform = RLPlatform(checkpoint.load_agent(path, mode='r'), world_args())
+    q = platform.agent.table.q.copy()
+    for i in range(500):
+        platform.updateLoop()
+    np.testing.assert_array_equal(platform.agent.table.q, q)
+    assert os.path.getsize(path) == size
+
+
+def test_save_profiled_agent(tmp_path):
+    platform = trained_platform(tp4.EpsilonGreedy(0.3, tp4.BSF(5)), n_steps=0)
+    PhaseProfiler(100).attach(platform)
+    for i in range(300):
+        platform.updateLoop()
+    path = str(tmp_path / 'agent.ckpt')
+    checkpoint.save_agent(platform.agent, path)
+    assert os.listdir(str(tmp_path)) == ['agent.ckpt']  # no temporary file left
+    assert not callable(checkpoint.read_metadata(path)['params'].get('nextState'))
+
+
+def test_failed_save_keeps_previous_checkpoint(tmp_path):
+    agent = trained_platform(tp4.EpsilonGreedy(0.3, tp4.BSF(5))).agent
+    path = str(tmp_path / 'agent.ckpt')
+    checkpoint.save_agent(agent, path)
+    with open(path, 'rb') as f:
+        saved = f.read()
+    agent.unsaved = object()  # not JSON serializable
+    with pytest.raises(TypeError):
+        checkpoint.save_agent(agent, path)
+    with open(path, 'rb') as f:
+        assert f.read() == saved
+    assert os.listdir(str(tmp_path)) == ['agent.ckpt']
+
+
+def test_resume_from_periodic_checkpoint(tmp_path):
+    prefix = str(tmp_path / 'run')
+    args = world_args(max_n_episode=1000, save=prefix, save_every=300)
+    spec = "tp4.EpsilonGreedy(0.3, tp4.BSF(5), 'qlearning')"
+    experiment.run_job((spec, {}, args, np.random.SeedSequence(0), 0, 0))
+    path = prefix + '_0_0.ckpt'
+    assert checkpoint.load_agent(path).steps_done == 1000
+    args['--max_n_episode'] = '1500'
+    stats = experiment.run_job(("checkpoint.load_agent({!r})".format(path), {}, args, np.random.SeedSequence(0), 0, 0))
+    assert stats.nSteps() == 500
+    assert checkpoint.load_agent(path).steps_done == 1500
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import rng
+from bench import world_args
+from check_engines import AnyActionAgent, trajectory
+from vec_env import VecEnvironment
+from wumpus_text import Environment, unpackState
+
+
+@pytest.mark.parametrize('grid_size', [2, 4, 7])
+@pytest.mark.parametrize('tore', ['True', 'False'])
+@pytest.mark.parametrize('wumpus_dyn', ['False', 'True'])
+def test_indexed_engine_plays_like_python(grid_size, tore, wumpus_dyn):
+    options = dict(grid_size=grid_size, tore=tore, wumpus_dyn=wumpus_dyn)
+    assert trajectory(3000, engine='indexed', **options) == trajectory(3000, engine='python', **options)
+
+
+@pytest.mark.parametrize('grid_size', [3, 5])
+@pytest.mark.parametrize('tore', ['True', 'False'])
+@pytest.mark.parametrize('wumpus_dyn', ['False', 'True'])
+def test_vec_environment_steps_like_environment(grid_size, tore, wumpus_dyn):
+    # the Wumpus moves are drawn from other streams: every step starts from the snapshot of env
+    rng.seed(0)
+    args = world_args(grid_size=grid_size, tore=tore, wumpus_dyn=wumpus_dyn)
+    env = Environment(AnyActionAgent(), args)
+    vec = VecEnvironment(1, args, seed=0)
+    for i in range(2000):
+        vec.restoreWorlds(slice(None), env.snapshot())
+        (state, a, reward, end_flag) = env.nextState()
+        (states, rewards, ends) = vec.step([a])
+        assert states[0].tolist() == unpackState(state)
+        assert (rewards[0], ends[0]) == (reward, end_flag)
+        env.agent.nextState(state, reward)
+        if end_flag:
+            env.reset()
+            assert vec.getStates()[0].tolist() == unpackState(env.agent.getState())
+
+
+def test_step_worlds_by_parts_is_one_step():
+    args = world_args(grid_size=4)
+    (whole, parts) = (VecEnvironment(8, args, seed=1), VecEnvironment(8, args, seed=1))
+    for step_actions in np.random.default_rng(2).integers(1, 9, size=(300, 8)):
+        (states, rewards, ends) = whole.step(step_actions)
+        first = parts.stepWorlds(np.arange(0, 8, 2), step_actions[0::2])
+        second = parts.stepWorlds(np.arange(1, 8, 2), step_actions[1::2])
+        np.testing.assert_array_equal(states[0::2], first[0])
+        np.testing.assert_array_equal(rewards[1::2], second[1])
+        np.testing.assert_array_equal(ends[1::2], second[2])
+        np.testing.assert_array_equal(whole.getStates(), parts.getStates())
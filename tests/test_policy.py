@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import policy
+import tp4
+from bench import world_args
+from vec_env import VecEnvironment
+from wumpus_text import packState
+from test_checkpoint import trained_platform
+
+
+@pytest.mark.parametrize('backend', ['dense', 'hashed'])
+def test_policy_round_trip(tmp_path, backend):
+    agent = trained_platform(tp4.EpsilonGreedy(0., tp4.XYBSF(4, 5), backend=backend)).agent
+    compiled = policy.compile_policy(agent)
+    assert compiled.deterministic()
+    path = str(tmp_path / 'policy.npz')
+    policy.save_policy(compiled, path)
+    loaded = policy.load_policy(path)
+    for name in ('actions', 'cdf', 'state_ids'):
+        if getattr(compiled, name) is None:
+            assert getattr(loaded, name) is None
+        else:
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(compiled, name))
+    # a greedy agent and its frozen policy play the same actions
+    frozen = policy.FrozenAgent(loaded)
+    frozen.restoreState(agent.state_)
+    assert frozen.getAction() == agent.getAction()
+
+
+def test_batch_lookup_matches_frozen_agent():
+    agent = trained_platform(tp4.Softmax(10., tp4.ABSF(5), backend='hashed')).agent
+    compiled = policy.compile_policy(agent, greedy=True)
+    env = VecEnvironment(64, world_args(), seed=0)
+    for i in range(50):
+        env.step(np.random.default_rng(i).integers(1, 9, size=64))
+    last_action = np.random.default_rng(0).integers(1, 9, size=64)
+    rows = compiled.rows(compiled.encoding.get_state_id(policy.BatchState(env.getStates(), last_action)))
+    batch_actions = compiled.actionsOf(rows, None)
+    frozen = policy.FrozenAgent(compiled)
+    for (state, a, batch_action) in zip(env.getStates(), last_action, batch_actions):
+        frozen.current_action = int(a)
+        frozen.restoreState(packState(*state.tolist()))
+        assert frozen.getAction() == batch_action
+
+
+def test_batch_evaluation_is_seeded():
+    compiled = policy.compile_policy(trained_platform(tp4.EpsilonGreedy(0.3, tp4.ABSF(5))).agent)
+    rewards = policy.evaluate_batch(compiled, world_args(), 64, 200, seed=0)
+    assert rewards.shape == (64,)
+    np.testing.assert_array_equal(rewards, policy.evaluate_batch(compiled, world_args(), 64, 200, seed=0))
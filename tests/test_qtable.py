@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import experiment
+from bench import world_args
+from qtable import QTable
+
+
+def random_updates(n, n_states=50, seed=0):
+    random = np.random.default_rng(seed)
+    return (random.integers(0, n_states, size=n), random.integers(0, 8, size=n), random.normal(size=n))
+
+
+def test_hashed_table_matches_dense():
+    (dense, hashed) = (QTable(50, 8), QTable(50, 8, backend='hashed', n_rows=4))
+    for (state, a, target) in zip(*random_updates(3000)):
+        dense.update(dense.row(int(state)), int(a), target)
+        hashed.update(hashed.row(int(state)), int(a), target)
+    for state in range(50):
+        (dense_row, hashed_row) = (dense.row(state), hashed.row(state))
+        np.testing.assert_allclose(hashed.values(hashed_row), dense.values(dense_row))
+        assert hashed.greedyAction(hashed_row) == dense.greedyAction(dense_row)
+        assert hashed.maxValue(hashed_row) == pytest.approx(dense.maxValue(dense_row))
+
+
+def test_greedy_action_is_first_argmax():
+    table = QTable(50, 8)
+    for (state, a, target) in zip(*random_updates(3000)):
+        table.update(int(state), int(a), np.round(target))  # many ties
+        assert table.greedy[state] == table.q[state].argmax()
+
+
+def test_update_batch_matches_updates():
+    (single, batch) = (QTable(50, 8), QTable(50, 8))
+    (states, actions, targets) = random_updates(500)
+    for (state, a, target) in zip(states, actions, targets):
+        single.update(int(state), int(a), target)
+    batch.updateBatch(states, actions, targets)
+    np.testing.assert_allclose(batch.q, single.q)
+    np.testing.assert_allclose(batch.n_visits, single.n_visits)
+    np.testing.assert_array_equal(batch.greedy, single.greedy)
+
+
+def test_evicting_table_keeps_at_most_max_rows():
+    table = QTable(1000, 8, backend='hashed', n_rows=4, max_rows=64)
+    for (state, a, target) in zip(*random_updates(5000, n_states=1000)):
+        table.update(table.row(int(state)), int(a), target)
+    assert table.nRows() <= 64
+
+
+@pytest.mark.parametrize('agent', ["tp4.EpsilonGreedy(0.2, tp4.XYBSF(4, 5), '{}', backend='{}')",
+                                   "tp4.Softmax(10., tp4.ABSF(5), '{}', backend='{}')"])
+@pytest.mark.parametrize('update_rule', ['average', 'qlearning'])
+def test_agents_play_the_same_with_both_backends(agent, update_rule):
+    args = world_args(grid_size=4, max_n_episode=3000)
+    stats = [experiment.run_job((agent.format(update_rule, backend), {}, args, np.random.SeedSequence(0), 0, 0))
+             for backend in ('dense', 'hashed')]
+    assert stats[0].getState()['totals'].tolist() == stats[1].getState()['totals'].tolist()
+    assert stats[0].nEpisodes() == stats[1].nEpisodes()
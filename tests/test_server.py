@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from bench import world_args
+from server import EnvClient, EnvServer
+from vec_env import VecEnvironment
+
+
+async def with_client(server, play):
+    tcp_server = await server.serve('127.0.0.1', 0)
+    client = EnvClient()
+    await client.connect('127.0.0.1', tcp_server.sockets[0].getsockname()[1])
+    try:
+        return await play(client)
+    finally:
+        await client.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+
+def test_served_steps_match_vec_environment():
+    args = world_args(grid_size=4, wumpus_dyn='True')
+    actions = np.random.default_rng(0).integers(1, 9, size=(100, 4))
+
+    async def play(client):
+        (envs, states) = await client.reset(n=4)
+        played = [states]
+        for step_actions in actions:
+            played.append(await client.batchStep(envs, step_actions))
+        return (envs, played)
+
+    (envs, played) = asyncio.run(with_client(EnvServer(args, n_envs=4, seed=0), play))
+    local = VecEnvironment(4, args, seed=0)
+    local.resetWorlds(envs)
+    assert played[0] == local.getStates()[envs].tolist()
+    for (step_actions, (states, rewards, dones)) in zip(actions, played[1:]):
+        (local_states, local_rewards, local_dones) = local.stepWorlds(np.array(envs), step_actions)
+        assert (states, rewards, dones) == (local_states.tolist(), local_rewards.tolist(), local_dones.tolist())
+
+
+def test_concurrent_steps_are_batched():
+    async def play(client):
+        (envs, states) = await client.reset(n=8)
+        results = await asyncio.gather(*[client.step(env, 1 + env % 8) for env in envs])
+        return results
+
+    server = EnvServer(world_args(), n_envs=8, seed=0)
+    results = asyncio.run(with_client(server, play))
+    assert len(results) == 8
+    assert server.n_steps == 8 and server.n_batches < 8
+
+
+def test_errors_are_answered():
+    async def play(client):
+        (envs, states) = await client.reset(n=2)
+        for request in [dict(op='step', env=5, action=1), dict(op='step', env=envs[0], action=9),
+                        dict(op='batch_step', envs=[envs[0], envs[0]], actions=[1, 1]),
+                        dict(op='reset', n=10), dict(op='fly')]:
+            with pytest.raises(RuntimeError):
+                await client.request(**request)
+        await client.close(envs)  # the worlds go back to the pool
+        return envs
+
+    server = EnvServer(world_args(), n_envs=4, seed=0)
+    asyncio.run(with_client(server, play))
+    assert len(server.free) == 4
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import rng
+import tp4
+from bench import world_args
+from wumpus_text import Environment
+
+
+def play(env, n_steps):
+    for i in range(n_steps):
+        (state, a, reward, end_flag) = env.nextState()
+        env.agent.nextState(state, reward)
+        if end_flag:
+            env.reset()
+
+
+@pytest.mark.parametrize('make_agent', [
+    lambda: tp4.EpsilonGreedy(0.5, tp4.XYBSF(4, 5), 'qlearning'),
+    lambda: tp4.EpsilonGreedy(0.5, tp4.ABSF(5), 'sarsa'),
+    lambda: tp4.UCB(1., tp4.BSF(5), 'qlearning'),
+    lambda: tp4.Dyna(0.5, tp4.XYBSF(4, 5), n_planning=4),
+])
+def test_restore_leaves_table_unchanged(make_agent):
+    rng.seed(0)
+    env = Environment(make_agent(), world_args(wumpus_dyn='True'))
+    play(env, 500)
+    agent = env.agent
+    snapshot = env.snapshot()
+    play(env, 7)
+    if agent.pending is None:  # make sure an update is waiting
+        play(env, 1)
+    (meta, arrays) = agent.table.getState()
+    before = {name: array.copy() for (name, array) in arrays.items()}
+    done_before = agent.replay.data['done'].copy() if isinstance(agent, tp4.Dyna) else None
+
+    env.restore(snapshot)
+
+    for (name, array) in agent.table.getState()[1].items():
+        np.testing.assert_array_equal(array, before[name], err_msg=name)
+    if done_before is not None:
+        np.testing.assert_array_equal(agent.replay.data['done'], done_before)
+    assert agent.getState() == snapshot[0]
+    assert agent.pending is None
+    assert agent.state_row == agent.table.row(agent.encoding.get_state_id(agent))
+    assert env.snapshot() == snapshot
+
+
+def test_restore_generated_world():
+    rng.seed(0)
+    env = Environment(tp4.EpsilonGreedy(0.5, tp4.BSF(5), 'qlearning'),
+                      world_args(grid_size=16, world_seed=3, n_holes=4, n_wumpus=3, wumpus_dyn='True'))
+    play(env, 200)
+    snapshot = env.snapshot()
+    play(env, 50)
+    env.restore(snapshot)
+    restored = env.snapshot()
+    assert restored[0] == snapshot[0]
+    np.testing.assert_array_equal(restored[1], snapshot[1])
+    np.testing.assert_array_equal(restored[2], snapshot[2])
+    with pytest.raises(ValueError):
+        env.restore((snapshot[0], 1, 2))
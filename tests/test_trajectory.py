@@ -0,0 +1,18 @@
+import trajectory
+from wumpus_text import packState
+
+
+def test_trajectory_round_trip(tmp_path):
+    path = str(tmp_path / 'steps.traj')
+    writer = trajectory.TrajectoryWriter(path, chunk_size=16)
+    states = [packState(x % 7, x % 5, x % 2, (x // 2) % 2, 40000 + x) for x in range(100)]
+    for (i, state) in enumerate(states):
+        writer.add(state, 1 + i % 8, float(i), i % 10 == 9)
+    writer.close()
+    steps = trajectory.load_trajectory(path)
+    assert len(steps) == 100
+    assert steps['n_flash'].tolist() == [40000 + x for x in range(100)]
+    assert steps['reward'].tolist() == [float(i) for i in range(100)]
+    assert steps['done'].sum() == 10
+    (curve_steps, curve) = trajectory.reward_curve(steps, n_points=10)
+    assert curve[-1] == sum(range(100))
@@ -0,0 +1,114 @@
+'''
+On-disk trajectory store.
+
+A trajectory file holds one fixed-size record per step: the state the
+agent acted from, the action, the reward and the end-of-episode flag.
+TrajectoryWriter buffers records and copies them in large chunks into
+an np.memmap of the file, which grows as needed. load_trajectory maps
+a finished file back as a read-only structured array, without copying.
+
+File layout: a HEADER_SIZE bytes header (magic, version, number of
+records) followed by the records, in STEP_DTYPE.
+'''
+
+import numpy as np
+
+from wumpus_text import unpackState
+
+MAGIC = b'WUMPTRAJ'
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('record_size', '<u4'),
+                         ('n_records', '<u8')])
+
+STEP_DTYPE = np.dtype([
+    ('x', '<i2'), ('y', '<i2'), ('smell', 'u1'), ('breeze', 'u1'), ('n_flash', '<u2'),
+    ('action', 'u1'), ('reward', '<f4'), ('done', '?')])
+
+
+class TrajectoryWriter(object):
+    '''
+    Append-only trajectory file
+    '''
+    def __init__(self, path, chunk_size=1 << 16):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.n_records = 0
+        self.capacity = 0
+        self.mm = None
+        with open(path, 'wb') as f:
+            f.write(self.header().tobytes().ljust(HEADER_SIZE, b'\0'))
+
+    def header(self):
+        return np.array((MAGIC, VERSION, STEP_DTYPE.itemsize, self.n_records), dtype=HEADER_DTYPE)
+
+    def add(self, state, action, reward, done):
+        '''state is a packed agent state'''
+        self.buffer.append(tuple(unpackState(state)) + (action, reward, done))
+        if len(self.buffer) == self.chunk_size:
+            self.flush()
+
+    def reserve(self, n_records):
+        '''Grow the file (at least doubling it) so that it can hold n_records'''
+        if n_records <= self.capacity:
+            return
+        self.capacity = max(n_records, 2 * self.capacity, self.chunk_size)
+        if self.mm is not None:
+            self.mm.flush()
+            del self.mm
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self.capacity * STEP_DTYPE.itemsize)
+        self.mm = np.memmap(self.path, dtype=STEP_DTYPE, mode='r+',
+                            offset=HEADER_SIZE, shape=(self.capacity,))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        chunk = np.array(self.buffer, dtype=STEP_DTYPE)
+        self.buffer = []
+        self.reserve(self.n_records + len(chunk))
+        self.mm[self.n_records:self.n_records + len(chunk)] = chunk
+        self.n_records += len(chunk)
+
+    def close(self):
+        '''Write pending records, cut the file to size and update the header'''
+        self.flush()
+        if self.mm is not None:
+            self.mm.flush()
+            del self.mm
+            self.mm = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self.n_records * STEP_DTYPE.itemsize)
+            f.write(self.header().tobytes())
+
+
+def load_trajectory(path):
+    '''Map a trajectory file as a read-only structured array of STEP_DTYPE'''
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError('{} is not a trajectory file'.format(path))
+    if header['version'] != VERSION or header['record_size'] != STEP_DTYPE.itemsize:
+        raise ValueError('unsupported trajectory version {} in {}'.format(header['version'], path))
+    n_records = int(header['n_records'])
+    if n_records == 0:
+        return np.zeros(0, dtype=STEP_DTYPE)
+    return np.memmap(path, dtype=STEP_DTYPE, mode='r', offset=HEADER_SIZE, shape=(n_records,))
+
+
+def reward_curve(trajectory, n_points=1000, chunk_size=1 << 22):
+    '''
+    Cumulative reward of a trajectory at (at most) n_points evenly spaced steps.
+
+    Return (steps, cumulative rewards). The trajectory is read chunk by chunk.
+    '''
+    n = len(trajectory)
+    steps = np.unique(np.linspace(1, n, min(n, n_points)).astype(np.int64))
+    curve = np.zeros(len(steps))
+    total = 0.
+    for start in range(0, n, chunk_size):
+        cum = total + np.cumsum(trajectory['reward'][start:start + chunk_size], dtype=np.float64)
+        inside = (steps > start) & (steps <= start + len(cum))
+        curve[inside] = cum[steps[inside] - start - 1]
+        total = cum[-1]
+    return (steps, curve)
@@ -0,0 +1,179 @@
+'''
+Batched version of wumpus_text.Environment.
+
+VecEnvironment keeps N independent Wumpus worlds in NumPy arrays and
+advances all of them with a single array-level step. Worlds that reach
+the end of an episode are reset automatically, like RLPlatform does
+for the scalar Environment.
+
+Rewards, torus topology (TORE_TOPO) and Wumpus dynamics (DYN_WUMPUS)
+follow the scalar Environment exactly, including its quirks: the Wumpus
+only draws UP/DOWN/LEFT moves, flashes do not wrap around the torus,
+and a dead Wumpus is moved like a live one (so it can come back).
+Generated worlds (--world_seed, see worlds) are not batched.
+
+State columns are those of an agent state:
+(x coordinate, y coordinate, smell, breeze, remaining number of shots)
+'''
+
+import numpy as np
+
+import rng
+import wumpus_text
+from wumpus_text import Action, FLASH_TARGET, unpackState
+
+X, Y, SMELL, BREEZE, N_FLASH = range(5)
+
+# Displacement of each action (indexed by action value, 0 is unused)
+MOVE_DX = np.zeros(len(Action) + 1, dtype=np.int64)
+MOVE_DY = np.zeros(len(Action) + 1, dtype=np.int64)
+MOVE_DY[Action.UP] = 1
+MOVE_DY[Action.DOWN] = -1
+MOVE_DX[Action.LEFT] = -1
+MOVE_DX[Action.RIGHT] = 1
+
+# Cell targeted by each flash action (indexed by action value)
+FLASH_DX = np.zeros(len(Action) + 1, dtype=np.int64)
+FLASH_DY = np.zeros(len(Action) + 1, dtype=np.int64)
+for (flash, (dx, dy)) in FLASH_TARGET.items():
+    (FLASH_DX[flash], FLASH_DY[flash]) = (dx, dy)
+
+
+class VecEnvironment:
+
+    def __init__(self, n_envs, my_args=None, seed=None):
+        if int(my_args["--world_seed"]) >= 0:
+            raise ValueError('only the classic world is batched (one hole, one Wumpus)')
+        self.n_envs_ = n_envs
+        self.grid_size_ = (int(my_args["--grid_size"]),int(my_args["--grid_size"]))
+        self.hole_pos_ = wumpus_text.HOLE_POS
+        self.treasure_pos_ = wumpus_text.treasurePosition(self.grid_size_)
+        self.wumpus_init_pos_ = wumpus_text.WUMPUS_INIT_POS
+
+        self.DEFAULT_N_FLASH = int(my_args["--n_flash"])
+        self.DEFAULT_REWARD = wumpus_text.DEFAULT_REWARD
+        self.KILL_REWARD = wumpus_text.KILL_REWARD
+        self.TREASURE_REWARD = wumpus_text.TREASURE_REWARD
+        self.HOLE_REWARD = wumpus_text.HOLE_REWARD
+        self.WUMPUS_REWARD = wumpus_text.WUMPUS_REWARD
+        self.TORE_TOPO = (my_args["--tore"]=="True")
+        self.DYN_WUMPUS = (my_args["--wumpus_dyn"]=="True")
+
+        if seed is None:
+            self.random_ = rng.generator()
+        else:
+            self.random_ = np.random.default_rng(seed)
+        self.states_ = np.zeros((n_envs, 5), dtype=np.int64)
+        self.wumpus_pos_ = np.zeros((n_envs, 2), dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.resetWorlds(np.ones(self.n_envs_, dtype=bool))
+
+    def resetWorlds(self, mask):
+        '''Reset the worlds selected by the boolean mask'''
+        self.states_[mask] = [0, 0, 0, 0, self.DEFAULT_N_FLASH]
+        self.wumpus_pos_[mask] = self.wumpus_init_pos_
+
+    def restoreWorlds(self, ids, snapshot):
+        '''Put the worlds ids in the state of an Environment.snapshot() of a classic world'''
+        (state, wx, wy) = snapshot
+        if isinstance(wx, np.ndarray):
+            raise ValueError('only snapshots of the classic world can be restored')
+        self.states_[ids] = unpackState(state)
+        self.wumpus_pos_[ids] = (wx, wy)
+
+    def getNEnvs(self):
+        return self.n_envs_
+
+    def getGridSize(self):
+        return self.grid_size_
+
+    def getStates(self):
+        return self.states_
+
+    def getWumpusPositions(self):
+        return self.wumpus_pos_
+
+    def wrap(self, x, y):
+        '''Apply the grid topology in place to positions one step away from the grid'''
+        if not self.TORE_TOPO:
+            np.clip(x, 0, self.grid_size_[0]-1, out=x)
+            np.clip(y, 0, self.grid_size_[1]-1, out=y)
+        else:
+            # Same wrapping as Environment.moveAgent: only -1 and grid_size are folded
+            x[x == self.grid_size_[0]] = 0
+            x[x == -1] = self.grid_size_[0]-1
+            y[y == self.grid_size_[1]] = 0
+            y[y == -1] = self.grid_size_[1]-1
+
+    def moveWumpus(self, ids=slice(None)):
+        n = self.n_envs_ if isinstance(ids, slice) else len(ids)
+        a = self.random_.integers(1, 4, size=n)  # Same hardcoded range as Environment
+        wx = self.wumpus_pos_[ids, 0] + MOVE_DX[a]
+        wy = self.wumpus_pos_[ids, 1] + MOVE_DY[a]
+        self.wrap(wx, wy)
+        self.wumpus_pos_[ids, 0] = wx
+        self.wumpus_pos_[ids, 1] = wy
+
+    def step(self, actions):
+        '''
+        Advance every world by one step.
+
+        actions: integer array of Action values, one per world.
+        Return (new_states, rewards, end_flags). new_states holds the
+        state reached by each world; worlds whose episode ended are reset
+        afterwards, so getStates() gives the states to act from next.
+        '''
+        return self.stepWorlds(slice(None), actions)
+
+    def stepWorlds(self, ids, actions):
+        '''
+        Same as step, for the worlds ids only (an array of distinct world
+        indices, or a slice); the other worlds do not move.
+        '''
+        a = np.asarray(actions, dtype=np.int64)
+        s = self.states_[ids]
+        x = s[:, X] + MOVE_DX[a]
+        y = s[:, Y] + MOVE_DY[a]
+        self.wrap(x, y)
+        n_flash = s[:, N_FLASH].copy()
+        wx = self.wumpus_pos_[ids, 0]
+        wy = self.wumpus_pos_[ids, 1]
+        rewards = np.full(len(a), self.DEFAULT_REWARD)
+
+        # Flashes use the position before the move (flash actions do not move)
+        flashing = (a >= Action.FLASH_UP) & (n_flash > 0)
+        n_flash -= flashing
+        killed = (flashing & (wx >= 0)
+                  & (wx == s[:, X] + FLASH_DX[a]) & (wy == s[:, Y] + FLASH_DY[a]))
+        wx[killed] = -1
+        wy[killed] = -1
+        self.wumpus_pos_[ids, 0] = wx
+        self.wumpus_pos_[ids, 1] = wy
+        rewards[killed] += self.KILL_REWARD
+
+        smell = np.abs(wx - x) + np.abs(wy - y) < 2
+        breeze = np.abs(self.hole_pos_[0] - x) + np.abs(self.hole_pos_[1] - y) < 2
+        new_states = np.column_stack((x, y, smell, breeze, n_flash))
+
+        # Same priority as Environment.testForEnd
+        met_wumpus = (wx == x) & (wy == y)
+        in_hole = ~met_wumpus & (x == self.hole_pos_[0]) & (y == self.hole_pos_[1])
+        on_treasure = (~met_wumpus & ~in_hole
+                       & (x == self.treasure_pos_[0]) & (y == self.treasure_pos_[1]))
+        rewards[met_wumpus] += self.WUMPUS_REWARD
+        rewards[in_hole] += self.HOLE_REWARD
+        rewards[on_treasure] += self.TREASURE_REWARD
+        end_flags = met_wumpus | in_hole | on_treasure
+
+        if self.DYN_WUMPUS:
+            self.moveWumpus(ids)
+
+        self.states_[ids] = new_states
+        if end_flags.any():
+            ended = np.zeros(self.n_envs_, dtype=bool)
+            ended[ids] = end_flags
+            self.resetWorlds(ended)
+
+        return (new_states, rewards, end_flags)
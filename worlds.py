@@ -0,0 +1,131 @@
+'''
+Procedurally generated Wumpus worlds.
+
+generate_layout draws, from a seed, the cells of any number of holes and
+Wumpuses and of the treasure on a grid (up to 4096x4096, the limit of
+packed states). A World keeps them as numpy grids indexed by [x, y]:
+
+- holes: True on hole cells, and breeze: True next to a hole (fixed);
+- wumpus_count: number of live Wumpuses on each cell, and smell: number
+  of live Wumpuses on or next to each cell.
+
+Senses and episode ends are one grid lookup, whatever the number of
+hazards. When Wumpuses move or die, wumpus_count and smell are updated
+for the cells around them only, with np.add.at over all the moving
+Wumpuses at once.
+
+As in Environment.updateSense, "next to" means at Manhattan distance
+less than 2 without wrapping around the torus. Unlike the classic world,
+a dead Wumpus stays dead (and off the grids) until the episode ends.
+'''
+
+import numpy as np
+
+# A hazard in a cell is sensed in the cell itself and its 4 neighbours
+SENSE_DX = np.array([0, 1, -1, 0, 0])
+SENSE_DY = np.array([0, 0, 0, 1, -1])
+
+# Moves of the Wumpus (indexed by action value, see wumpus_text.Action)
+MOVE_DX = np.array([0, 0, 0, -1, 1])
+MOVE_DY = np.array([0, 1, -1, 0, 0])
+
+
+def generate_layout(grid_size, n_holes, n_wumpus, seed):
+    '''
+    (hole positions, treasure position, Wumpus positions) on distinct
+    cells, never on the start cell (0, 0)
+    '''
+    n_cells = grid_size[0] * grid_size[1]
+    if n_holes + n_wumpus + 1 > n_cells - 1:
+        raise ValueError("{} holes and {} Wumpuses do not fit in a {}x{} grid".format(
+            n_holes, n_wumpus, grid_size[0], grid_size[1]))
+    random = np.random.default_rng(seed)
+    cells = 1 + random.choice(n_cells - 1, size=n_holes + n_wumpus + 1, replace=False)
+    positions = np.column_stack(np.divmod(cells, grid_size[1]))
+    return (positions[:n_holes], (int(positions[n_holes, 0]), int(positions[n_holes, 1])),
+            positions[n_holes + 1:])
+
+
+class World(object):
+    '''
+    Occupancy and sense grids of one world, see above
+    '''
+    def __init__(self, grid_size, hole_pos, treasure_pos, wumpus_pos, tore):
+        self.grid_size = grid_size
+        self.tore = tore
+        self.treasure_pos = treasure_pos
+        hole_pos = np.asarray(hole_pos, dtype=np.int64).reshape(-1, 2)
+        self.holes = np.zeros(grid_size, dtype=bool)
+        self.holes[hole_pos[:, 0], hole_pos[:, 1]] = True
+        breeze = np.zeros(grid_size, dtype=np.int32)
+        np.add.at(breeze.ravel(), self.senseCells(hole_pos[:, 0], hole_pos[:, 1]), 1)
+        self.breeze = breeze > 0
+
+        self.wumpus_init = np.asarray(wumpus_pos, dtype=np.int64).reshape(-1, 2)
+        self.wumpus = self.wumpus_init.copy()
+        self.alive = np.ones(len(self.wumpus), dtype=bool)
+        self.wumpus_count = np.zeros(grid_size, dtype=np.int32)
+        self.smell = np.zeros(grid_size, dtype=np.int32)
+        # flat views, for updates by cell id (x*height + y)
+        (self.wumpus_count_flat, self.smell_flat) = (self.wumpus_count.ravel(), self.smell.ravel())
+        self.place(np.arange(len(self.wumpus)), 1)
+
+    def senseCells(self, x, y):
+        '''Ids of the cells around every (x, y), in the grid'''
+        nx = (x[:, None] + SENSE_DX).ravel()
+        ny = (y[:, None] + SENSE_DY).ravel()
+        inside = (nx >= 0) & (nx < self.grid_size[0]) & (ny >= 0) & (ny < self.grid_size[1])
+        return nx[inside] * self.grid_size[1] + ny[inside]
+
+    def place(self, ids, delta):
+        '''Add (1) or remove (-1) the Wumpuses ids from wumpus_count and smell'''
+        (x, y) = (self.wumpus[ids, 0], self.wumpus[ids, 1])
+        delta = np.int32(delta)  # same dtype as the grids: np.add.at is much slower when casting
+        np.add.at(self.wumpus_count_flat, x * self.grid_size[1] + y, delta)
+        np.add.at(self.smell_flat, self.senseCells(x, y), delta)
+
+    def reset(self):
+        '''Every Wumpus back, alive, to its initial cell'''
+        # only the Wumpuses that moved or died need an update
+        changed = ~self.alive | (self.wumpus != self.wumpus_init).any(axis=1)
+        self.place(np.flatnonzero(changed & self.alive), -1)
+        ids = np.flatnonzero(changed)
+        self.wumpus[ids] = self.wumpus_init[ids]
+        self.alive[ids] = True
+        self.place(ids, 1)
+
+    def restore(self, wumpus, alive):
+        '''Put the Wumpuses back to given positions and alive flags'''
+        self.place(np.flatnonzero(self.alive), -1)
+        self.wumpus[...] = wumpus
+        self.alive[...] = alive
+        self.place(np.flatnonzero(self.alive), 1)
+
+    def kill(self, x, y):
+        '''Kill the Wumpuses in (x, y), return how many died'''
+        if not (0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]) or not self.wumpus_count[x, y]:
+            return 0
+        ids = np.flatnonzero(self.alive & (self.wumpus[:, 0] == x) & (self.wumpus[:, 1] == y))
+        self.place(ids, -1)
+        self.alive[ids] = False
+        return len(ids)
+
+    def moveWumpuses(self, generator):
+        '''Move every live Wumpus, drawing its move as Environment.moveWumpus does'''
+        ids = np.flatnonzero(self.alive)
+        a = generator.integers(1, 4, size=len(ids))  # same hardcoded range as Environment
+        x = self.wumpus[ids, 0] + MOVE_DX[a]
+        y = self.wumpus[ids, 1] + MOVE_DY[a]
+        if self.tore:
+            x %= self.grid_size[0]
+            y %= self.grid_size[1]
+        else:
+            np.clip(x, 0, self.grid_size[0] - 1, out=x)
+            np.clip(y, 0, self.grid_size[1] - 1, out=y)
+        self.place(ids, -1)
+        self.wumpus[ids, 0] = x
+        self.wumpus[ids, 1] = y
+        self.place(ids, 1)
+
+    def livePositions(self):
+        return self.wumpus[self.alive].tolist()
@@ -22,7 +22,7 @@ created by Gaetan Marceau Caron   [01/02/2016]
 and updated by Guillaume Charpiat [24/02/2016]
 small modifications by Gabriel Huang [03/2016]
 
-Usage: wumpus [-i <flag>] [-t <flag>] [-w <flag>] [-v <flag>] [-d <flag>] [-g <size>] [-n <int>] [-e <int>] [-r <int>]
+Usage: wumpus [-i <flag>] [-t <flag>] [-w <flag>] [-v <flag>] [-d <flag>] [-g <size>] [-n <int>] [-e <int>] [-r <int>] [-c <float>] [-M <int>] [-j <int>] [-s <int>] [-o <path>] [-x <name>] [-p <path>] [-P <int>] [-f <float>] [-R <int>] [-S <path>] [-O <path>] [-W <int>] [--n_holes <int>] [--n_wumpus <int>] [--cache <dir>] [--cache_mb <int>] [--save_every <int>]
 
 Options:
 -h --help      Show the description of the program
@@ -35,30 +35,42 @@ Options:
 -n <int> --n_flash <int>  an integer for the number of power units [default: 5]
 -e <int> --max_n_episode <int>  the maximum number of episode [default: 100]
 -r <int> --runs <int>   the number of runs over which to average [default: 1]
+-c <float> --ci <float>   add batches of --runs runs to every agent until the 95% confidence interval of its average reward/step is within +/- <float> or does not overlap the other agents' ones, 0 for exactly --runs runs [default: 0]
+-M <int> --max_runs <int>   the maximum number of runs of an agent with --ci [default: 100]
+-j <int> --jobs <int>   the number of worker processes, 0 for one per CPU [default: 0]
+-s <int> --seed <int>   the seed from which every run draws its own random seed [default: 0]
+-o <path> --record <path>   record every step of run r of agent k to <path>_<k>_<r>.traj [default: ]
+-x <name> --engine <name>   the environment engine: indexed (lookup tables) or python [default: indexed]
+-p <path> --profile <path>   time the phases of run r of agent k and dump them to <path>_<k>_<r>.json [default: ]
+-P <int> --profile_every <int>   the number of steps between two profile samples [default: 1000]
+-f <float> --fps <float>   the maximum number of frames per second drawn by the display thread, 0 to draw from the loop [default: 10]
+-R <int> --render_every <int>   show the world every <int> steps [default: 1]
+-S <path> --save <path>   save the learning agent of run r of agent k to <path>_<k>_<r>.ckpt (see checkpoint), agents without a Q-table are not saved [default: ]
+-O <path> --plot <path>   write the reward curves to an image file (e.g. curves.png) instead of showing them [default: ]
+-W <int> --world_seed <int>   the seed of a generated world (see worlds), -1 for the classic world [default: -1]
+--n_holes <int>   the number of holes of a generated world [default: 1]
+--n_wumpus <int>   the number of Wumpuses of a generated world [default: 1]
+--cache <dir>   reuse the results of runs already played, kept in <dir> (see cache) [default: ]
+--cache_mb <int>   the maximum size of the cache directory, in MB [default: 100]
+--save_every <int>   with --save, also save the agent every <int> steps, 0 for only at the end; a run whose agent spec is checkpoint.load_agent('<path>_<k>_<r>.ckpt') resumes from the saved step [default: 0]
 """
 
 from __future__ import print_function
 
-import sys
 #from tkinter import *
 #from PIL import Image, ImageTk
 import numpy as np
-from time import sleep
+from collections import deque
 from enum import IntEnum, unique
 from docopt import docopt
-import matplotlib.pyplot as plt
 
-# All user defined agents
-import tp4
+import render
+import rng
+import worlds
+from stats import RewardStats, summarize_runs, mean_interval
 
-message = ""
 silent = True  # indicate start/end of episodes
 
-def flush_message():
-    global message
-    sys.stdout.write(message)
-    message = ""
-
 
 @unique
 class Action(IntEnum):
@@ -71,19 +83,99 @@ class Action(IntEnum):
     FLASH_LEFT = 7
     FLASH_RIGHT = 8
 
+N_ACTIONS = len(Action)
+
+
+@unique
+class Outcome(IntEnum):
+    # What ends an episode (or happens during it), emitted by the Environment
+    WUMPUS = 0
+    HOLE = 1
+    TREASURE = 2
+    KILL = 3
+
+
+class EventChannel:
+    # Outcomes emitted by one environment: counted, and kept in a bounded
+    # buffer of the most recent ones only if someone reads them (the HMI)
+
+    def __init__(self, maxlen=0):
+        self.counts = [0]*len(Outcome)  # since creation, indexed by Outcome
+        self.setBuffer(maxlen)
+
+    def setBuffer(self, maxlen):
+        self.recent = deque(maxlen=maxlen) if maxlen else None
+
+    def emit(self, outcome):
+        self.counts[outcome] += 1
+        if self.recent is not None:
+            self.recent.append(outcome)
+
+    def drain(self):
+        # buffered outcomes, oldest first, and empty the buffer
+        if not self.recent:
+            return []
+        events = list(self.recent)
+        self.recent.clear()
+        return events
+
+
+# An agent state is : (x coordinate, y coordinate, smell the Wumpus?, feel breeze?, remaining number of shots)
+# packed in one integer, from the lowest bits: shots (16 bits), breeze, smell, y (12 bits), x (12 bits)
+BREEZE_SHIFT = 16
+SMELL_SHIFT = 17
+Y_SHIFT = 18
+X_SHIFT = 30
+COORD_MASK = 0xFFF
+FLASH_MASK = 0xFFFF
+
+# Cell targeted by each flash action (flashes do not wrap around the torus)
+FLASH_TARGET = {
+    Action.FLASH_UP: (0, 1),
+    Action.FLASH_DOWN: (0, -1),
+    Action.FLASH_LEFT: (-1, 0),
+    Action.FLASH_RIGHT: (1, 0),
+}
+
+# Rewards and layout of the classic world (the treasure is in the far
+# corner, see treasurePosition), shared by the engines that simulate it
+# (vec_env, solver)
+DEFAULT_REWARD = -1.
+KILL_REWARD = 5.
+TREASURE_REWARD = 100.
+HOLE_REWARD = -10.
+WUMPUS_REWARD = -10.
+HOLE_POS = (1,1)
+WUMPUS_INIT_POS = (1,2)
+
+def treasurePosition(grid_size):
+    return (grid_size[0]-1,grid_size[1]-1)
+
+def packState(x, y, smell, breeze, n_flash):
+    return x << X_SHIFT | y << Y_SHIFT | smell << SMELL_SHIFT | breeze << BREEZE_SHIFT | n_flash
+
+def unpackState(s):
+    return [s >> X_SHIFT, s >> Y_SHIFT & COORD_MASK, s >> SMELL_SHIFT & 1, s >> BREEZE_SHIFT & 1, s & FLASH_MASK]
+
 
 class Agent:
     def __init__(self):
+        self.rng_ = rng.stream()
         self.reset()
 
     def reset(self):
         pass
 
     def getAction(self):
-        return Action(np.random.randint(1,len(Action)))
+        return self.rng_.randint(1,N_ACTIONS)
+
+    def observeWorld(self, environment):
+        # Called by the environment the agent is put in; only agents
+        # allowed to see the whole world (e.g. planners) keep it
+        pass
 
     def getPosition(self):
-        return self.state_[:2]
+        return [self.state_ >> X_SHIFT, self.state_ >> Y_SHIFT & COORD_MASK]
 
     def getState(self):
         return self.state_
@@ -91,48 +183,116 @@ class Agent:
     def nextState(self,s,reward):
         self.state_ = s
 
+    def restoreState(self, s):
+        # Put the agent in state s without a step or an episode end
+        # (Environment.restore): learning agents do not update anything
+        self.state_ = s
+
+
+# Tables of the indexed engine, shared by all the Environments of the same
+# grid, topology, hole and treasure (see Environment.buildTables)
+ENGINE_TABLES = {}
+
+# A Wumpus is smelled in its cell and the 4 next to it
+SMELL_OFFSETS = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+
 
 class Environment:
 
     def __init__(self, agent, my_args=None):
         self.grid_size_ = (int(my_args["--grid_size"]),int(my_args["--grid_size"]))
-        self.hole_pos_ = (1,1)
-        self.treasure_pos_ = (self.grid_size_[0]-1,self.grid_size_[1]-1)
+        self.hole_pos_ = HOLE_POS
+        self.treasure_pos_ = treasurePosition(self.grid_size_)
 
         self.agent = agent
+        self.my_args_ = my_args
 
         self.DEFAULT_N_FLASH = int(my_args["--n_flash"])
-        self.DEFAULT_REWARD = -1.
-        self.KILL_REWARD = 5.
-        self.TREASURE_REWARD = 100.
-        self.HOLE_REWARD = -10.
-        self.WUMPUS_REWARD = -10.
+        self.DEFAULT_REWARD = DEFAULT_REWARD
+        self.KILL_REWARD = KILL_REWARD
+        self.TREASURE_REWARD = TREASURE_REWARD
+        self.HOLE_REWARD = HOLE_REWARD
+        self.WUMPUS_REWARD = WUMPUS_REWARD
         self.TORE_TOPO = (my_args["--tore"]=="True")
         self.DYN_WUMPUS = (my_args["--wumpus_dyn"]=="True")
-
+        # the tables only know Wumpuses on the grid: not the one starting at (1,2) of a 2x2 grid
+        self.INDEXED_ENGINE = (my_args["--engine"]=="indexed") and self.cellId(WUMPUS_INIT_POS) >= 0
+        self.rng_ = rng.stream()
+        self.events_ = EventChannel()
+
+        self.world_ = None  # worlds.World of a generated world
+        if int(my_args["--world_seed"]) >= 0:
+            self.generateWorld(int(my_args["--world_seed"]), int(my_args["--n_holes"]), int(my_args["--n_wumpus"]))
+        if self.INDEXED_ENGINE:
+            self.buildTables()
+        self.agent.observeWorld(self)
         self.reset()
 
     def reset(self):
+        if self.world_ is not None:
+            self.world_.reset()
         self.agent.reset()
         init_state = self.getInitState()
         self.agent.nextState(init_state, 0.)
-        self.wumpus_pos_ = [1,2]
+        self.wumpus_pos_ = list(WUMPUS_INIT_POS)
+        if self.INDEXED_ENGINE:
+            self.setWumpusCell(list(WUMPUS_INIT_POS))
         if not silent:
             print("\n **** New start **** \n")
 
     def getInitState(self):
-        return [0,0,0,0,self.DEFAULT_N_FLASH]
-        # An agent state is : (x coordinate, y coordinate, smell the Wumpus?, feel breeze?, remaining number of shots)
+        if self.world_ is not None:
+            return packState(0,0,int(self.world_.smell[0,0] > 0),int(self.world_.breeze[0,0]),self.DEFAULT_N_FLASH)
+        return packState(0,0,0,0,self.DEFAULT_N_FLASH)
+        # An agent state is : (x coordinate, y coordinate, smell the Wumpus?, feel breeze?, remaining number of shots), packed
+
+    # Snapshots: the whole state of a classic world is the agent state and
+    # the Wumpus position, (packed state, Wumpus x, Wumpus y), which
+    # vec_env.VecEnvironment.restoreWorlds also takes. A generated world
+    # adds its Wumpuses instead: (packed state, positions, alive flags).
+    # Restoring only puts the agent in the state of the snapshot
+    # (Agent.restoreState): learning agents neither end their episode nor
+    # update their Q-table.
+
+    def snapshot(self):
+        if self.world_ is not None:
+            return (self.agent.state_, self.world_.wumpus.copy(), self.world_.alive.copy())
+        return (self.agent.state_, self.wumpus_pos_[0], self.wumpus_pos_[1])
+
+    def restore(self, snapshot):
+        if isinstance(snapshot[1], np.ndarray) != (self.world_ is not None):
+            raise ValueError('the snapshot is not one of this kind of world')
+        self.agent.restoreState(snapshot[0])
+        if self.world_ is not None:
+            self.world_.restore(snapshot[1], snapshot[2])
+        elif self.INDEXED_ENGINE:
+            self.setWumpusCell([snapshot[1], snapshot[2]])
+        else:
+            self.wumpus_pos_ = [snapshot[1], snapshot[2]]
 
     def getGridSize(self):
         return self.grid_size_
 
     def getWumpusPosition(self):
+        if self.world_ is not None:
+            # first live Wumpus of a generated world
+            positions = self.world_.livePositions()
+            return positions[0] if positions else [-1,-1]
         return self.wumpus_pos_
 
+    def getWumpusPositions(self):
+        if self.world_ is not None:
+            return self.world_.livePositions()
+        return [self.wumpus_pos_]
+
     def getHolePosition(self):
         return self.hole_pos_
 
+    def getHolePositions(self):
+        if self.world_ is not None:
+            return np.argwhere(self.world_.holes).tolist()
+        return [self.hole_pos_]
+
     def getTreasurePosition(self):
         return self.treasure_pos_
 
@@ -140,8 +300,13 @@ class Environment:
         return self.n_flash_
 
     def moveWumpus(self):
-        a = Action(np.random.randint(1,4)) #Warning hardcoded value!
-        self.wumpus_pos_ = self.moveAgent(self.wumpus_pos_,a)
+        a = self.rng_.randint(1,4) #Warning hardcoded value!
+        if self.INDEXED_ENGINE and self.wumpus_cell_ >= 0:
+            self.setWumpusCell(self.cell_pos_[self.next_cell_[a][self.wumpus_cell_]].tolist())
+        else:
+            self.wumpus_pos_ = self.moveAgent(self.wumpus_pos_,Action(a))
+            if self.INDEXED_ENGINE:
+                self.setWumpusCell(self.wumpus_pos_)
 
     def moveAgent(self, curr_pos, a):
         next_pos = []
@@ -193,16 +358,15 @@ class Environment:
         return False
 
     def testForEnd(self, s):
-        global message
         agent_pos = s[:2]
         if self.wumpus_pos_[0] == agent_pos[0] and self.wumpus_pos_[1] == agent_pos[1]:
-            message += "\n ---- Met the Wumpus... and died ---- \n"
+            self.events_.emit(Outcome.WUMPUS)
             return (self.WUMPUS_REWARD, True)
         elif self.hole_pos_[0] == agent_pos[0] and self.hole_pos_[1] == agent_pos[1]:
-            message += "\n ---- Stepped in a hole... and died ---- \n"
+            self.events_.emit(Outcome.HOLE)
             return (self.HOLE_REWARD, True)
         elif self.treasure_pos_[0] == agent_pos[0] and self.treasure_pos_[1] == agent_pos[1]:
-            message += "\n ---- Found the treasure ! ---- \n"
+            self.events_.emit(Outcome.TREASURE)
             return (self.TREASURE_REWARD, True)
         else:
             return (0, False)
@@ -215,11 +379,166 @@ class Environment:
             breeze = 1
         return [smell,breeze]
 
-    def nextState(self):
+    # Generated worlds: any number of holes and Wumpuses, kept in the
+    # occupancy and sense grids of a worlds.World. The other engines are
+    # not used: nextState is replaced by nextStateWorld.
+
+    def generateWorld(self, seed, n_holes, n_wumpus):
+        if self.grid_size_[0] > COORD_MASK+1 or self.grid_size_[1] > COORD_MASK+1:
+            raise ValueError("grid too large for packed states")
+        (hole_pos, self.treasure_pos_, wumpus_pos) = worlds.generate_layout(self.grid_size_, n_holes, n_wumpus, seed)
+        self.world_ = worlds.World(self.grid_size_, hole_pos, self.treasure_pos_, wumpus_pos, self.TORE_TOPO)
+        self.hole_pos_ = tuple(hole_pos[0].tolist()) if n_holes else (-1,-1)
+        self.INDEXED_ENGINE = False
+        self.nextState = self.nextStateWorld
+
+    def nextStateWorld(self):
+        a = self.agent.getAction()
+        s = self.agent.getState()
+        reward = self.DEFAULT_REWARD
+        world = self.world_
+
+        x = s >> X_SHIFT
+        y = s >> Y_SHIFT & COORD_MASK
+        n_flash = s & FLASH_MASK
+        if a < 5:
+            (x, y) = self.moveAgent([x, y], a)
+        elif n_flash > 0:
+            n_flash -= 1
+            (dx, dy) = FLASH_TARGET[a]
+            for i in range(world.kill(x+dx, y+dy)):
+                reward += self.KILL_REWARD
+                self.events_.emit(Outcome.KILL)
+
+        new_state = packState(x, y, int(world.smell[x, y] > 0), int(world.breeze[x, y]), n_flash)
+        (end_reward, end_flag) = (0, False)
+        if world.wumpus_count[x, y]:
+            self.events_.emit(Outcome.WUMPUS)
+            (end_reward, end_flag) = (self.WUMPUS_REWARD, True)
+        elif world.holes[x, y]:
+            self.events_.emit(Outcome.HOLE)
+            (end_reward, end_flag) = (self.HOLE_REWARD, True)
+        elif (x, y) == world.treasure_pos:
+            self.events_.emit(Outcome.TREASURE)
+            (end_reward, end_flag) = (self.TREASURE_REWARD, True)
+
+        if self.DYN_WUMPUS:
+            world.moveWumpuses(self.rng_.generator)
+
+        return (new_state, a, reward+end_reward, end_flag)
+
+    # Indexed engine: for a fixed grid and topology, moves, senses and
+    # episode ends are looked up in tables indexed by cell id (x*height + y),
+    # built with the methods above so that results are identical.
+
+    def cellId(self, pos):
+        '''Cell id of a position, -1 if out of the grid (dead Wumpus)'''
+        if 0 <= pos[0] < self.grid_size_[0] and 0 <= pos[1] < self.grid_size_[1]:
+            return pos[0]*self.grid_size_[1] + pos[1]
+        return -1
+
+    def buildTables(self):
+        if self.grid_size_[0] > COORD_MASK+1 or self.grid_size_[1] > COORD_MASK+1 or self.DEFAULT_N_FLASH > FLASH_MASK:
+            raise ValueError("grid or number of shots too large for packed states")
+        key = (self.grid_size_, self.TORE_TOPO, tuple(self.hole_pos_), tuple(self.treasure_pos_),
+               self.HOLE_REWARD, self.TREASURE_REWARD)
+        if key not in ENGINE_TABLES:
+            ENGINE_TABLES[key] = self.computeTables()
+        (self.cell_pos_, self.next_cell_, self.flash_cell_, self.neighbours_,
+         self.cell_bits_, self.end_) = ENGINE_TABLES[key]  # read only, shared
+        n_cells = self.grid_size_[0]*self.grid_size_[1]
+        self.smell_mask_ = [0]*(n_cells+1)  # smell bit (packed) of each cell, plus padding (see neighbours_)
+        self.wumpus_cell_ = -1
+
+    def computeTables(self):
+        '''Tables of the indexed engine, in O(number of cells)'''
+        (width, height) = self.grid_size_
+        n_cells = width*height
+        cells = np.arange(n_cells)
+        (x, y) = (cells // height, cells % height)
+        # cell_pos_[c]: (x, y) of cell c
+        cell_pos = np.column_stack((x, y))
+
+        def cellIds(nx, ny):
+            inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+            return np.where(inside, nx*height + ny, -1)
+
+        # next_cell_[a][c]: cell reached by moving with action a (a flash does not move),
+        # with the topology of moveAgent
+        # flash_cell_[a][c]: cell hit by flashing with action a (no wrap), -1 if none
+        next_cell = [cells.tolist() for a in range(len(Action)+1)]
+        flash_cell = [[-1]*n_cells for a in range(len(Action)+1)]
+        for (move, flash, dx, dy) in ((Action.UP, Action.FLASH_UP, 0, 1), (Action.DOWN, Action.FLASH_DOWN, 0, -1),
+                                      (Action.LEFT, Action.FLASH_LEFT, -1, 0), (Action.RIGHT, Action.FLASH_RIGHT, 1, 0)):
+            (nx, ny) = (x + dx, y + dy)
+            flash_cell[flash] = cellIds(nx, ny).tolist()
+            if self.TORE_TOPO:
+                (nx, ny) = (nx % width, ny % height)  # moves are one cell: same as moveAgent
+            else:
+                (nx, ny) = (np.clip(nx, 0, width-1), np.clip(ny, 0, height-1))
+            next_cell[move] = (nx*height + ny).tolist()
+        # neighbours_[c]: cells where a Wumpus in c can be smelled (Manhattan
+        # distance < 2, no wrap), padded with the extra cell n_cells
+        neighbours = np.column_stack([cellIds(x + dx, y + dy) for (dx, dy) in SMELL_OFFSETS])
+        neighbours[neighbours < 0] = n_cells
+        # cell_bits_[c]: packed state bits of position and breeze in c
+        breeze = (np.abs(self.hole_pos_[0] - x) + np.abs(self.hole_pos_[1] - y) < 2).astype(np.int64)
+        cell_bits = packState(x, y, 0, breeze, 0).tolist()
+        # end_[c]: (reward, end flag, outcome) of reaching c, the Wumpus aside
+        end = [(0, False, None)]*n_cells
+        end[self.cellId(self.treasure_pos_)] = (self.TREASURE_REWARD, True, Outcome.TREASURE)
+        end[self.cellId(self.hole_pos_)] = (self.HOLE_REWARD, True, Outcome.HOLE)
+        return (cell_pos, next_cell, flash_cell, neighbours, cell_bits, end)
+
+    def setWumpusCell(self, pos):
+        '''Move the Wumpus to pos, updating its cell and the smell mask'''
+        self.wumpus_pos_ = pos
+        cell = self.cellId(pos)
+        if cell != self.wumpus_cell_:
+            if self.wumpus_cell_ >= 0:
+                for c in self.neighbours_[self.wumpus_cell_].tolist():
+                    self.smell_mask_[c] = 0
+            if cell >= 0:
+                for c in self.neighbours_[cell].tolist():
+                    self.smell_mask_[c] = 1 << SMELL_SHIFT
+            self.wumpus_cell_ = cell
+
+    def nextStateIndexed(self):
         a = self.agent.getAction()
         s = self.agent.getState()
         reward = self.DEFAULT_REWARD
-        global message
+
+        cell = (s >> X_SHIFT)*self.grid_size_[1] + (s >> Y_SHIFT & COORD_MASK)
+        n_flash = s & FLASH_MASK
+        if a < 5:
+            cell = self.next_cell_[a][cell]
+        elif n_flash > 0:
+            n_flash -= 1
+            if self.flash_cell_[a][cell] == self.wumpus_cell_ >= 0:
+                self.setWumpusCell([-1,-1])
+                reward += self.KILL_REWARD
+                self.events_.emit(Outcome.KILL)
+
+        new_state = self.cell_bits_[cell] | self.smell_mask_[cell] | n_flash
+        if cell == self.wumpus_cell_:
+            self.events_.emit(Outcome.WUMPUS)
+            (end_reward, end_flag) = (self.WUMPUS_REWARD, True)
+        else:
+            (end_reward, end_flag, outcome) = self.end_[cell]
+            if end_flag:
+                self.events_.emit(outcome)
+
+        if self.DYN_WUMPUS:
+            self.moveWumpus()
+
+        return (new_state, a, reward+end_reward, end_flag)
+
+    def nextState(self):
+        if self.INDEXED_ENGINE:
+            return self.nextStateIndexed()
+        a = self.agent.getAction()
+        s = unpackState(self.agent.getState())
+        reward = self.DEFAULT_REWARD
 
         next_agent_pos = s[:2]
         n_flash = s[-1]
@@ -231,7 +550,7 @@ class Environment:
                 flash_success = self.flashAgent(s, a)
                 if flash_success:
                     reward += self.KILL_REWARD
-                    message += "\n ---- Killed the Wumpus ! ---- \n"
+                    self.events_.emit(Outcome.KILL)
 
         sense = self.updateSense(next_agent_pos)
         new_state = next_agent_pos+sense+[n_flash]
@@ -240,7 +559,7 @@ class Environment:
         if self.DYN_WUMPUS:
             self.moveWumpus()
 
-        return (new_state, a, reward+end_reward, end_flag)
+        return (packState(*new_state), a, reward+end_reward, end_flag)
 
 
 
@@ -249,19 +568,44 @@ class Environment:
 
 class WumpusTextHMI:
 
+    EVENT_TEXT = {
+        Outcome.WUMPUS: " ---- Met the Wumpus... and died ---- ",
+        Outcome.HOLE: " ---- Stepped in a hole... and died ---- ",
+        Outcome.TREASURE: " ---- Found the treasure ! ---- ",
+        Outcome.KILL: " ---- Killed the Wumpus ! ---- ",
+    }
+    N_RECENT_EVENTS = 5  # event lines shown under the grid
+
     def __init__(self, agent, my_args=None):
-        self.DELTA_TIME = 1
-        self.char_per_box = 1
         self.draw_contours = True
         self.LOGGER_TIME_STEP = (my_args["--verbose"]=="True")
         self.DISPLAY = (my_args["--display"]=="True")
+        self.FPS = float(my_args["--fps"])
+        self.RENDER_EVERY = int(my_args["--render_every"])
         self.agent = agent
         self.reset()
         self.environment = Environment(self.agent,my_args)
         self.agent_prev_pos = self.agent.getPosition()
         self.wumpus_prev_pos = self.environment.getWumpusPosition()
+        self.stats = RewardStats(int(my_args["--max_n_episode"]))
+        self.recorder = None  # optional trajectory.TrajectoryWriter
+        self.profiler = None  # set by profiler.PhaseProfiler.attach
+        self.n_steps_ = 0
+        self.log_line_ = ""
+        self.event_lines_ = deque(maxlen=self.N_RECENT_EVENTS)
+        self.render_thread = None
         self.loadImages()
         if (self.DISPLAY):
+            self.environment.events_.setBuffer(self.N_RECENT_EVENTS)
+            self.renderer = render.TextRenderer(
+                self.environment.getGridSize(), self.environment.getHolePositions(),
+                self.environment.getTreasurePosition(),
+                {'wumpus': self.image_wumpus, 'hole': self.image_hole,
+                 'treasure': self.image_treasure, 'hunter': self.image_hunter},
+                self.draw_contours)
+            if self.FPS > 0:
+                self.render_thread = render.RenderThread(self.renderer, self.FPS)
+                self.render_thread.start()
             self.displayWorld()
 
     def loadImages(self):
@@ -270,45 +614,30 @@ class WumpusTextHMI:
         self.image_treasure = '$'
         self.image_hunter = '+'
 
-    def convertCoord(self,pos):
-        grid_size = self.environment.getGridSize()
-        return (grid_size[1] - pos[1] - 1, pos[0])
+    def snapshot(self):
+        status = ["time step " + str(self.n_steps_) + "; cumulated reward " + str(self.stats.total)]
+        if self.log_line_:
+            status.append(self.log_line_)
+        return (tuple(self.agent.getPosition()), tuple(map(tuple, self.environment.getWumpusPositions())),
+                tuple(status) + tuple(self.event_lines_))
 
     def displayWorld(self):
-        line_width = (self.char_per_box + 1) * self.environment.getGridSize()[1] + 1
-        horizontal_line =  '-' * line_width
-        print('\n')
-        if self.draw_contours:
-            print(horizontal_line)
-
-        for line in range(self.environment.getGridSize()[0]):
-            if self.draw_contours:
-                sys.stdout.write('|')
-            for col in range(self.environment.getGridSize()[1]):
-                letter = ' '
-
-                if (line,col) == self.convertCoord(self.environment.getWumpusPosition()):
-                    letter = self.image_wumpus
-
-                if (line,col) == self.convertCoord(self.environment.getHolePosition()):
-                    letter = self.image_hole
-
-                if (line,col) == self.convertCoord(self.environment.getTreasurePosition()):
-                    letter = self.image_treasure
-
-                if (line,col) == self.convertCoord(self.agent.getPosition()):
-                    letter = self.image_hunter
-
-                sys.stdout.write(letter)
-                if self.draw_contours:
-                    sys.stdout.write('|')
-
-            sys.stdout.write('\n')
-            if self.draw_contours:
-                print(horizontal_line)
+        # hand the current world to the render thread, or draw it now
+        if self.render_thread is not None:
+            self.render_thread.publish(self.snapshot())
+        else:
+            self.renderer.draw(self.snapshot())
 
-        sys.stdout.write('\n')
+    def displayEvents(self):
+        for outcome in self.environment.events_.drain():
+            self.event_lines_.append(self.EVENT_TEXT[outcome])
 
+    def close(self):
+        # stop the render thread after drawing the last state
+        if self.render_thread is not None:
+            self.displayWorld()
+            self.render_thread.stop()
+            self.render_thread = None
 
     def reset(self):
         self.time_step_ = 0
@@ -322,12 +651,18 @@ class WumpusTextHMI:
         self.agent.nextState(new_state,reward)
 
         self.time_step_ += 1
+        self.n_steps_ += 1
         self.cumul_reward_ += reward
+        self.stats.add(reward, end_flag)
+        if self.recorder is not None:
+            self.recorder.add(prev_state, a, reward, end_flag)
         if(self.LOGGER_TIME_STEP):
-            print("time step " + str(self.time_step_) + " : state " + str(prev_state) + " with " + str(a) + " ==> new state " + str(self.agent.getState()) + "; cumulated reward " + str(self.cumul_reward_))
+            self.log_line_ = "time step " + str(self.time_step_) + " : state " + str(unpackState(prev_state)) + " with " + str(Action(a)) + " ==> new state " + str(unpackState(self.agent.getState())) + "; cumulated reward " + str(self.cumul_reward_)
+            if not self.DISPLAY:
+                print(self.log_line_)
 
         if (self.DISPLAY):
-            flush_message()
+            self.displayEvents()
 
         if(end_flag):
             if not silent:
@@ -335,9 +670,7 @@ class WumpusTextHMI:
             self.reset()
             self.environment.reset()
 
-
-        if (self.DISPLAY):
-            sleep(1)   # only for human-intended display: to be removed to go faster
+        if (self.DISPLAY and self.n_steps_ % self.RENDER_EVERY == 0):
             self.displayWorld()
 
 
@@ -352,7 +685,9 @@ class RLPlatform:
         self.reset()
         self.environment = Environment(self.agent,my_args)
         self.agent_prev_pos = self.agent.getPosition()
-        self.all_rewards = []
+        self.stats = RewardStats(int(my_args["--max_n_episode"]))
+        self.recorder = None  # optional trajectory.TrajectoryWriter
+        self.profiler = None  # set by profiler.PhaseProfiler.attach
 
     def reset(self):
         self.time_step_ = 0
@@ -366,9 +701,11 @@ class RLPlatform:
 
         self.time_step_ += 1
         self.cumul_reward_ += reward
-        self.all_rewards.append(reward)
+        self.stats.add(reward, end_flag)
+        if self.recorder is not None:
+            self.recorder.add(prev_state, a, reward, end_flag)
         if(self.LOGGER_TIME_STEP):
-            print("time step " + str(self.time_step_) + " " + str(prev_state) + " " + str(a) + " " + str(self.agent.getState()) + " " + str(self.cumul_reward_))
+            print("time step " + str(self.time_step_) + " " + str(unpackState(prev_state)) + " " + str(Action(a)) + " " + str(unpackState(self.agent.getState())) + " " + str(self.cumul_reward_))
 
         if(end_flag):
             if not silent:
@@ -377,7 +714,6 @@ class RLPlatform:
             self.environment.reset()
 
 
-
 if __name__ == "__main__":
 
     # Retrieve the arguments from the command-line
@@ -413,6 +749,12 @@ if __name__ == "__main__":
         # # for temp in [10]
 #     ] + [('Agent()', 'random')]
 
+    # Compare with the optimal policy (which sees the Wumpus)
+    # agents += [('solver.OptimalAgent()', 'optimal')]
+
+    # Plan online with batched Monte-Carlo rollouts (also sees the Wumpus)
+    # agents += [('rollout.RolloutAgent(1024, 10)', 'rollouts')]
+
 #     # UCB - doesnt work
     # agents = [
         # ('tp4.UCB({}, tp4.BSF(n_flash))'.format(lbda),
@@ -421,40 +763,35 @@ if __name__ == "__main__":
 #     ] + [('Agent()', 'random')]
 
 
-    for agent_, name in agents:
-        runs_all_rewards = []
-        for run in xrange(int(my_args['--runs'])):
-            agent = eval(agent_)
-            if my_args["--hmi"]=="True":
-                platform = WumpusTextHMI(agent, my_args)
-            else:
-                platform = RLPlatform(agent, my_args)
-            for i in range(int(my_args["--max_n_episode"])):
-                platform.updateLoop()
+    import experiment
+    import plotting
+    specs = [agent_ for agent_, name in agents]
+    namespace = {'eps': eps, 'grid_size': grid_size, 'n_flash': n_flash}
+    if float(my_args["--ci"]) > 0:
+        all_results = experiment.run_sequential(specs, my_args, namespace,
+                                                float(my_args["--ci"]), int(my_args["--max_runs"]))
+    else:
+        all_results = experiment.run_experiments(specs, my_args, namespace)
 
+    curves = []
+    for (agent_, name), runs_stats in zip(agents, all_results):
+        for stats in runs_stats:
             print ('Average reward/step for "{}": {}'.format(
                 name,
-                np.mean(platform.all_rewards)))
-
-            runs_all_rewards.append(platform.all_rewards)
+                stats.mean()))
 
+        (mean, std, steps, curve) = summarize_runs(runs_stats)
         print ('"{}" over {} runs: {:.3f} +/- {:.3f}'.format(
             name,
-            len(runs_all_rewards),
-            np.mean(runs_all_rewards),
-            np.std(np.mean(runs_all_rewards, axis=1))
+            len(runs_stats),
+            mean,
+            std
         ))
+        if float(my_args["--ci"]) > 0:
+            print ('    95% confidence interval: {:.3f} +/- {:.3f}'.format(
+                *mean_interval([stats.mean() for stats in runs_stats])))
 
-        runs_all_rewards = np.asarray(runs_all_rewards)
-        # yerr = np.std(np.cumsum(runs_all_rewards, axis=1), axis=0)
-
-        #plt.plot(np.cumsum(np.mean(runs_all_rewards, axis=0)), label=name)
-        plt.errorbar(np.arange(len(runs_all_rewards[0])),
-                     np.cumsum(np.mean(runs_all_rewards, axis=0)),
-                     label=name)
-
-        plt.xlabel('steps')
+        curves.append((name, steps, curve))
 
-    plt.legend()
-    plt.show()
+    plotting.plot_curves(curves, my_args["--plot"])
 